@@ -0,0 +1,238 @@
+'''
+Box to target assignment for the Sokoban heuristics.
+
+The cost matrices are lists of rows (one row per box, one column per target)
+and use math.inf for a box that cannot be pushed to a target.
+'''
+import math
+
+# finite stand-in for math.inf inside the Hungarian algorithm
+UNREACHABLE = 10 ** 6
+
+
+def min_cost_assignment(cost):
+    '''
+    Hungarian algorithm, O(n^3).
+    Return (total, assignment) where assignment[i] is the column given to row i.
+    total is math.inf when no assignment avoids the unreachable pairs.
+    The matrix must have at least as many columns as rows.
+    '''
+    n, m = len(cost), len(cost[0]) if cost else 0
+    if n == 0:
+        return 0, []
+    # potentials and matching are 1-indexed, column 0 is a virtual column
+    u, v = [0] * (n + 1), [0] * (m + 1)
+    match = [0] * (m + 1)  # match[j]: row assigned to column j
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_v = [math.inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = match[j0], math.inf, 0
+            row = cost[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    c = row[j - 1]
+                    reduced = (UNREACHABLE if c == math.inf else c) - u[i0] - v[j]
+                    if reduced < min_v[j]:
+                        min_v[j], way[j] = reduced, j0
+                    if min_v[j] < delta:
+                        delta, j1 = min_v[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        # augment along the alternating path
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    assignment = [0] * n
+    for j in range(1, m + 1):
+        if match[j]:
+            assignment[match[j] - 1] = j - 1
+    total = sum(cost[i][assignment[i]] for i in range(n))
+    return total, assignment
+
+
+def greedy_assignment(cost):
+    '''
+    Assign the cheapest remaining (row, column) pair first, O(n^2 log n).
+    A row left without a reachable free column falls back to its cheapest
+    column, so the total is an estimate rather than a lower bound.
+    Return (total, assignment) like min_cost_assignment.
+    '''
+    pairs = sorted((c, i, j) for i, row in enumerate(cost) for j, c in enumerate(row) if c != math.inf)
+    assignment = [None] * len(cost)
+    taken = set()
+    for c, i, j in pairs:
+        if assignment[i] is None and j not in taken:
+            assignment[i] = j
+            taken.add(j)
+    for i, row in enumerate(cost):
+        if assignment[i] is None:
+            # fallback: no free column left, reuse the cheapest one
+            assignment[i] = min(range(len(row)), key=row.__getitem__)
+    total = sum(cost[i][assignment[i]] for i in range(len(cost)))
+    return total, assignment
+
+
+def augment(row, edges, owner, visited):
+    '''
+    Kuhn's augmenting path search: try to give row a column, moving the
+    rows already matched along an alternating path.
+    edges: row -> the columns it may take
+    owner: column -> row, updated in place when a path is found
+    visited: the columns already tried in this search
+    Return True if row got a column.
+    '''
+    for column in edges[row]:
+        if column in visited:
+            continue
+        visited.add(column)
+        if column not in owner or augment(owner[column], edges, owner, visited):
+            owner[column] = row
+            return True
+    return False
+
+
+
+def perfect_matching(rows, edges):
+    '''
+    Return a dict row -> column matching every row of rows to a distinct
+    column, or None when there is none.
+    '''
+    owner = {}
+    for row in rows:
+        if not augment(row, edges, owner, set()):
+            return None
+    return {row: column for column, row in owner.items()}
+
+
+def repair_matching(matching, row, new_row, edges):
+    '''
+    Repair a perfect matching (row -> column, not modified) after row is
+    replaced by new_row: new_row keeps the column of row when it may take
+    it, otherwise a single augmenting path is searched for new_row.
+    Return the new row -> column dict, or None when there is no perfect
+    matching any more.
+    '''
+    matching = dict(matching)
+    column = matching.pop(row)
+    if column in edges[new_row]:
+        matching[new_row] = column
+        return matching
+    owner = {c: r for r, c in matching.items()}
+    if not augment(new_row, edges, owner, set()):
+        return None
+    return {r: c for c, r in owner.items()}
+
+
+class IncrementalAssignment:
+    '''
+    A min-cost assignment of rows to columns kept with the dual potentials
+    of the Hungarian algorithm, so that after the costs of one row change
+    the optimum is restored by a single augmentation, O(m^2), instead of
+    being solved again, O(n^2 m).
+    The rows are padded with zero-cost rows up to the number of columns,
+    so that every column is assigned and the potentials of a freed column
+    need no fixing.
+    keys: row key (e.g. a box cell) -> row index, from 1
+    total: the cost of the real rows, math.inf when one of them is given
+           an unreachable column, like min_cost_assignment
+    '''
+    __slots__ = ('keys', 'cost', 'u', 'v', 'match', 'total')
+
+    def __init__(self, keys, cost, u, v, match):
+        self.keys = keys
+        self.cost = cost
+        self.u = u
+        self.v = v
+        self.match = match
+        self.total = None
+
+    @classmethod
+    def solve(cls, rows, m):
+        '''
+        rows: a dict key -> cost row of m columns, at most m rows
+        '''
+        keys = {key: index for index, key in enumerate(rows, 1)}
+        padding = (0,) * m
+        cost = [None] + list(rows.values()) + [padding] * (m - len(rows))
+        assignment = cls(keys, cost, [0] * (m + 1), [0] * (m + 1), [0] * (m + 1))
+        for i in range(1, m + 1):
+            assignment.augment(i)
+        assignment.update_total()
+        return assignment
+
+    def replace(self, key, new_key, new_cost):
+        '''
+        return a new IncrementalAssignment where the row 'key' becomes the
+        row 'new_key' with costs new_cost, this one is not modified
+        '''
+        i = self.keys[key]
+        keys = dict(self.keys)
+        del keys[key]
+        keys[new_key] = i
+        cost = list(self.cost)
+        cost[i] = new_cost
+        u, match = list(self.u), list(self.match)
+        match[match.index(i, 1)] = 0
+        # with the other potentials unchanged and v <= 0, u[i] = 0 keeps them feasible
+        u[i] = 0
+        assignment = IncrementalAssignment(keys, cost, u, list(self.v), match)
+        assignment.augment(i)
+        assignment.update_total()
+        return assignment
+
+    def augment(self, i):
+        '''
+        one phase of the Hungarian algorithm, see min_cost_assignment:
+        assign row i, the only unassigned row, along a shortest augmenting path
+        '''
+        cost, u, v, match = self.cost, self.u, self.v, self.match
+        m = len(v) - 1
+        way = [0] * (m + 1)
+        match[0] = i
+        j0 = 0
+        min_v = [math.inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = match[j0], math.inf, 0
+            row = cost[i0]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    c = row[j - 1]
+                    reduced = (UNREACHABLE if c == math.inf else c) - u[i0] - v[j]
+                    if reduced < min_v[j]:
+                        min_v[j], way[j] = reduced, j0
+                    if min_v[j] < delta:
+                        delta, j1 = min_v[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+        match[0] = 0
+
+    def update_total(self):
+        real = len(self.keys)
+        self.total = sum(self.cost[i][j - 1] for j, i in enumerate(self.match) if 0 < i <= real)
@@ -0,0 +1,165 @@
+'''
+Solve many warehouses on a pool of worker processes.
+
+solve_many hands the warehouses to the workers one at a time, the ones
+expected to take longest first, and yields every result as soon as it
+is known. Each worker owns a pipe, so the parent always knows which
+warehouse a worker is on: a worker that goes over the timeout is
+terminated and replaced, the other workers keep going.
+
+Usage:
+    python ./batch.py --folder ./warehouses --macro true --workers 8 --timeout 60
+'''
+import argparse
+import glob
+import json
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+
+from mySokobanSolver import scan_warehouse, solve_sokoban_elem, solve_sokoban_macro
+from sokoban import Warehouse
+
+
+def expected_effort(problem_file):
+    '''
+    a rough size of the state space of the warehouse: the number of ways
+    to place its boxes on the interior cells that are not taboo
+    0 for a file that does not load, it fails fast anyway
+    '''
+    wh = Warehouse()
+    try:
+        wh.load_warehouse(problem_file)
+        interior_cells, taboo, _ = scan_warehouse(wh)
+    except (AssertionError, ValueError, OSError):
+        return 0
+    return math.comb(len(interior_cells - taboo), len(wh.boxes))
+
+
+def solve_file(problem_file, macro):
+    '''
+    solve one warehouse file
+    return (actions or 'Impossible', duration)
+    '''
+    wh = Warehouse()
+    wh.load_warehouse(problem_file)
+    start = time.time()
+    actions = solve_sokoban_macro(wh) if macro else solve_sokoban_elem(wh)
+    return actions, time.time() - start
+
+
+def batch_worker(conn, macro):
+    '''
+    solve the files received on conn until None is received
+    send back ('done', actions, duration) or ('error', message, duration)
+    '''
+    while True:
+        problem_file = conn.recv()
+        if problem_file is None:
+            return
+        start = time.time()
+        try:
+            actions, duration = solve_file(problem_file, macro)
+            conn.send(('done', actions, duration))
+        except Exception as error:
+            conn.send(('error', repr(error), time.time() - start))
+
+
+def solve_many(paths, macro=False, workers=None, timeout=None, key=expected_effort):
+    '''
+    solve the warehouse files of paths on 'workers' processes
+    (os.cpu_count() by default), the largest key(path) first
+    timeout: seconds allowed to each warehouse, None for no limit
+    yield, in completion order, dicts with
+        house: the path
+        status: 'solved' | 'impossible' | 'timeout' | 'error'
+        solution: the actions, 'Impossible', or None
+        duration: seconds spent on the warehouse
+        error: the exception, for status 'error'
+    '''
+    pending = sorted(paths, key=key)  # pop() takes the largest first
+    workers = max(1, min(workers or os.cpu_count(), len(pending)))
+    running = {}  # conn -> (process, path, start time)
+    idle = []
+
+    def spawn():
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=batch_worker, args=(child_conn, macro), daemon=True)
+        process.start()
+        child_conn.close()
+        return parent_conn, process
+
+    def stop(conn, process):
+        process.terminate()
+        process.join()
+        conn.close()
+
+    try:
+        idle = [spawn() for _ in range(workers)]
+        while pending or running:
+            while pending and idle:
+                conn, process = idle.pop()
+                path = pending.pop()
+                conn.send(path)
+                running[conn] = (process, path, time.time())
+
+            wait = None
+            if timeout is not None:
+                deadline = min(start for _, _, start in running.values()) + timeout
+                wait = max(0.0, deadline - time.time())
+            ready = multiprocessing.connection.wait(list(running), timeout=wait)
+
+            for conn in ready:
+                process, path, start = running.pop(conn)
+                try:
+                    status, value, duration = conn.recv()
+                except EOFError:
+                    # the worker died, e.g. killed for running out of memory
+                    stop(conn, process)
+                    idle.append(spawn())
+                    yield {'house': path, 'status': 'error', 'solution': None, 'duration': time.time() - start,
+                           'error': f'worker exited with code {process.exitcode}'}
+                    continue
+                idle.append((conn, process))
+                if status == 'error':
+                    yield {'house': path, 'status': 'error', 'solution': None, 'duration': duration, 'error': value}
+                else:
+                    yield {'house': path, 'status': 'impossible' if value == 'Impossible' else 'solved',
+                           'solution': value, 'duration': duration}
+
+            if timeout is not None:
+                now = time.time()
+                for conn, (process, path, start) in list(running.items()):
+                    if now - start >= timeout:
+                        del running[conn]
+                        stop(conn, process)
+                        idle.append(spawn())
+                        yield {'house': path, 'status': 'timeout', 'solution': None, 'duration': now - start}
+    finally:
+        # also reached when the caller stops iterating early
+        for conn, (process, _, _) in running.items():
+            stop(conn, process)
+        for conn, process in idle:
+            conn.send(None)
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+
+
+if __name__ == '__main__':
+    from runner import str2bool
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--folder', type=str, default='./warehouses')
+    parser.add_argument('--macro', type=str2bool, default=False)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=None)
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.folder, '*.txt')))
+    for result in solve_many(files, args.macro, args.workers, args.timeout):
+        result['solution'] = str(result['solution'])
+        print(json.dumps(result), flush=True)
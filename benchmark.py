@@ -0,0 +1,348 @@
+'''
+Benchmarks comparing solver variants over the warehouses folder.
+
+Usage:
+    python ./benchmark.py states --macro true --limit 20000
+
+Each benchmark prints one line per warehouse followed by a summary line.
+A search is aborted once it expands more than --limit nodes, so that the
+hard puzzles do not dominate the run.
+'''
+import argparse
+import glob
+import time
+import tracemalloc
+
+import search
+from mySokobanSolver import SokobanPuzzle
+from runner import str2bool
+from sokoban import Warehouse
+
+
+class NodeLimitExceeded(Exception):
+    pass
+
+
+def count_expansions(solver, limit):
+    '''
+    Instrument solver.actions so that every expansion is counted.
+    Return a one element list holding the counter.
+    Raise NodeLimitExceeded once more than limit nodes have been expanded.
+    '''
+    counter = [0]
+    actions = solver.actions
+
+    def counted_actions(state):
+        counter[0] += 1
+        if counter[0] > limit:
+            raise NodeLimitExceeded()
+        return actions(state)
+
+    solver.actions = counted_actions
+    return counter
+
+
+def run(solver, limit, search_fn=search.astar_graph_search):
+    '''
+    Run search_fn on solver and return (expanded nodes, duration, solved)
+    solved is None if the node limit was hit.
+    '''
+    counter = count_expansions(solver, limit)
+    start = time.time()
+    try:
+        solved = search_fn(solver) is not None
+    except NodeLimitExceeded:
+        solved = None
+    return counter[0], time.time() - start, solved
+
+
+def load_all(files):
+    '''
+    yield (problem_file, warehouse) for every file that parses as a warehouse
+    '''
+    for problem_file in files:
+        wh = Warehouse()
+        try:
+            wh.load_warehouse(problem_file)
+        except (AssertionError, ValueError):
+            print(f'{problem_file:<32}invalid warehouse, skipped')
+            continue
+        yield problem_file, wh
+
+
+def report(name, rows):
+    '''
+    print a table of (warehouse, [(expanded, duration, solved), ...]) rows
+    and the total expansions over the warehouses every variant finished
+    '''
+    print(f'== {name} ==')
+    totals = None
+    durations = [0.0] * len(rows[0][1]) if rows else []
+    for problem_file, results in rows:
+        durations = [total + result[1] for total, result in zip(durations, results)]
+        cells = []
+        for expanded, duration, solved in results:
+            status = 'limit' if solved is None else ('ok' if solved else 'impossible')
+            cells.append(f'{expanded:>8} {duration:7.2f}s {status:<10}')
+        print(f'{problem_file:<32}' + ' | '.join(cells))
+        if all(solved is not None for _, _, solved in results):
+            expanded = [result[0] for result in results]
+            totals = expanded if totals is None else [a + b for a, b in zip(totals, expanded)]
+    if totals:
+        print('total expanded (finished by all): ' +
+              ' | '.join(f'{t} ({t / totals[0]:.1%})' for t in totals))
+    print('total time: ' + ' | '.join(f'{d:.2f}s' for d in durations))
+
+
+class CanonicalStatePuzzle(SokobanPuzzle):
+    '''
+    SokobanPuzzle without the later features that rely on the sorted boxes
+    tuple (the worker region representative, the matching and assignment
+    caches), so that bench_states compares the state encodings alone.
+    '''
+
+    def __init__(self, warehouse, **kwargs):
+        super().__init__(warehouse, matching_check=False, incremental_h=False, **kwargs)
+
+    def canonical_worker(self, worker, boxes, key=None):
+        return worker
+
+
+class UnorderedStatePuzzle(CanonicalStatePuzzle):
+    '''
+    CanonicalStatePuzzle with the original state encoding, where the boxes
+    tuple follows the iteration order of a set. Kept for comparison only.
+    '''
+
+    def __init__(self, warehouse, **kwargs):
+        super().__init__(warehouse, **kwargs)
+        self.initial = (warehouse.worker, tuple(warehouse.boxes))
+
+    def result(self, state, action):
+        worker, boxes = state
+        boxes = set(boxes)
+        if self.macro:
+            (box_y, box_x), direction = action
+            dx, dy = self.directions[direction]
+            boxes.remove((box_x, box_y))
+            boxes.add((box_x + dx, box_y + dy))
+            return (box_x, box_y), tuple(boxes)
+        dx, dy = self.directions[action]
+        new_worker_pos = (worker[0] + dx, worker[1] + dy)
+        if new_worker_pos in boxes:
+            boxes.remove(new_worker_pos)
+            boxes.add((new_worker_pos[0] + dx, new_worker_pos[1] + dy))
+        return new_worker_pos, tuple(boxes)
+
+
+def bench_states(files, args):
+    '''expanded nodes with the set-ordered state encoding vs the canonical one'''
+    rows = []
+    for problem_file, wh in load_all(files):
+        rows.append((problem_file, [
+            run(UnorderedStatePuzzle(wh, macro=args.macro), args.limit),
+            run(CanonicalStatePuzzle(wh, macro=args.macro), args.limit),
+        ]))
+    report('states: unordered | canonical', rows)
+
+
+class RawWorkerPuzzle(SokobanPuzzle):
+    '''
+    SokobanPuzzle that keeps the exact worker cell in macro states.
+    Kept for comparison only.
+    '''
+
+    def canonical_worker(self, worker, boxes, key=None):
+        return worker
+
+
+def bench_regions(files, args):
+    '''macro expanded nodes with the exact worker cell vs the worker region representative'''
+    rows = []
+    for problem_file, wh in load_all(files):
+        rows.append((problem_file, [
+            run(RawWorkerPuzzle(wh, macro=True), args.limit),
+            run(SokobanPuzzle(wh, macro=True), args.limit),
+        ]))
+    report('regions: exact worker | region representative', rows)
+
+
+def bench_engines(files, args):
+    '''expanded nodes and time of the tuple engine vs the bitboard engine'''
+    rows = []
+    for problem_file, wh in load_all(files):
+        rows.append((problem_file, [
+            run(SokobanPuzzle(wh, macro=args.macro, engine='tuple'), args.limit),
+            run(SokobanPuzzle(wh, macro=args.macro, engine='bitboard'), args.limit),
+        ]))
+    report('engines: tuple | bitboard', rows)
+
+
+def bench_zobrist(files, args):
+    '''expanded nodes and time with plain (worker, boxes) tuples vs ZobristState states'''
+    rows = []
+    for problem_file, wh in load_all(files):
+        rows.append((problem_file, [
+            run(SokobanPuzzle(wh, macro=args.macro, zobrist=False), args.limit),
+            run(SokobanPuzzle(wh, macro=args.macro, zobrist=True), args.limit),
+        ]))
+    report('zobrist: tuple states | zobrist states', rows)
+
+
+def bench_reachability(files, args):
+    '''macro search without and with the reachability cache, and the cache hit rate'''
+    rows, stats = [], []
+    for problem_file, wh in load_all(files):
+        cached = SokobanPuzzle(wh, macro=True)
+        rows.append((problem_file, [
+            run(SokobanPuzzle(wh, macro=True, reachability_cache_size=0), args.limit),
+            run(cached, args.limit),
+        ]))
+        stats.append((problem_file, cached.reachability.stats()))
+    report('reachability: no cache | cache', rows)
+    for problem_file, stat in stats:
+        print(f"{problem_file:<32}hits {stat['hits']:>8} misses {stat['misses']:>8} hit rate {stat['hit_rate']:.1%}")
+
+
+def bench_corrals(files, args):
+    '''macro expanded nodes and time without and with PI-corral pruning'''
+    rows = []
+    for problem_file, wh in load_all(files):
+        rows.append((problem_file, [
+            run(SokobanPuzzle(wh, macro=True), args.limit),
+            run(SokobanPuzzle(wh, macro=True, corral_pruning=True), args.limit),
+        ]))
+    report('corrals: no pruning | PI-corral pruning', rows)
+
+
+def bench_tunnels(files, args):
+    '''macro expanded nodes and time with single pushes vs compound tunnel pushes'''
+    rows = []
+    for problem_file, wh in load_all(files):
+        rows.append((problem_file, [
+            run(SokobanPuzzle(wh, macro=True), args.limit),
+            run(SokobanPuzzle(wh, macro=True, tunnel_macros=True), args.limit),
+        ]))
+    report('tunnels: single pushes | tunnel macros', rows)
+
+
+def bench_matching(files, args):
+    '''expanded nodes and time without and with the box to target matching check'''
+    rows = []
+    for problem_file, wh in load_all(files):
+        rows.append((problem_file, [
+            run(SokobanPuzzle(wh, macro=args.macro, matching_check=False), args.limit),
+            run(SokobanPuzzle(wh, macro=args.macro), args.limit),
+        ]))
+    report('matching: no check | matching check', rows)
+
+
+def bench_incremental(files, args):
+    '''time with the heuristic assignment solved for every node vs repaired from the parent's'''
+    rows = []
+    for problem_file, wh in load_all(files):
+        rows.append((problem_file, [
+            run(SokobanPuzzle(wh, macro=args.macro, incremental_h=False), args.limit),
+            run(SokobanPuzzle(wh, macro=args.macro), args.limit),
+        ]))
+    report('incremental h: full | incremental', rows)
+
+
+class DictNode:
+    '''search.Node before it had __slots__, the fields in an instance __dict__'''
+
+    def __init__(self, state, parent=None, action=None, path_cost=0):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.path_cost = path_cost
+        self.depth = parent.depth + 1 if parent else 0
+
+
+def node_bytes(node_class, count=100000):
+    '''
+    bytes allocated per node for a chain of count expanded nodes, each with
+    a fresh macro action and all sharing one state, i.e. the memory of the
+    search tree itself without the states
+    '''
+    state = ((1, 1), ((2, 2),))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    node = node_class(state)
+    for i in range(count):
+        node = node_class(state, node, ((i % 20, i % 30), 'Left'), i + 1)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+def bench_nodes(files, args):
+    '''bytes per node with a __dict__ vs the slotted search.Node, and peak search memory'''
+    print('== nodes: dict-based | slotted Node ==')
+    print(f'bytes per node: {node_bytes(DictNode):.1f} | {node_bytes(search.Node):.1f}')
+    for problem_file, wh in load_all(files):
+        solver = SokobanPuzzle(wh, macro=args.macro)
+        tracemalloc.start()
+        expanded, duration, solved = run(solver, args.limit)
+        print(f'{problem_file:<32}{tracemalloc.get_traced_memory()[1] / 2 ** 20:8.2f}MB {expanded:>8} nodes')
+        tracemalloc.stop()
+
+
+def bench_memo(files, args):
+    '''peak search memory with search.memoize vs BoundedMemo, and the BoundedMemo hit rate'''
+    print('== memo: memoize | BoundedMemo ==')
+    for problem_file, wh in load_all(files):
+        cells = []
+        for bounded in (False, True):
+            solver = SokobanPuzzle(wh, macro=args.macro)
+            h = search.BoundedMemo(solver.h) if bounded else search.memoize(solver.h)
+            tracemalloc.start()
+            expanded, duration, solved = run(solver, args.limit, lambda problem: search.best_first_graph_search(
+                problem, lambda n: n.path_cost + h(n)))
+            cells.append(f'{tracemalloc.get_traced_memory()[1] / 2 ** 20:8.2f}MB {expanded:>8} nodes')
+            tracemalloc.stop()
+        cells.append(f'hit rate {h.hit_rate():.1%}')
+        print(f'{problem_file:<32}' + ' | '.join(cells))
+
+
+def bench_spill(files, args):
+    '''peak search memory and time with the in-memory explored set vs DiskBackedSet'''
+    print(f'== spill: set | DiskBackedSet(hot_capacity={args.spill}) ==')
+    for problem_file, wh in load_all(files):
+        cells = []
+        for spill_after in (None, args.spill):
+            solver = SokobanPuzzle(wh, macro=args.macro, history_check=spill_after is None)
+            explored = solver.explored_store(spill_after)
+            tracemalloc.start()
+            expanded, duration, solved = run(
+                solver, args.limit, lambda problem: search.astar_graph_search(problem, explored=explored))
+            cells.append(f'{tracemalloc.get_traced_memory()[1] / 2 ** 20:8.2f}MB {duration:7.2f}s {expanded:>8} nodes')
+            tracemalloc.stop()
+        print(f'{problem_file:<32}' + ' | '.join(cells))
+
+
+BENCHMARKS = {
+    'states': bench_states,
+    'engines': bench_engines,
+    'regions': bench_regions,
+    'reachability': bench_reachability,
+    'corrals': bench_corrals,
+    'tunnels': bench_tunnels,
+    'matching': bench_matching,
+    'incremental': bench_incremental,
+    'zobrist': bench_zobrist,
+    'nodes': bench_nodes,
+    'memo': bench_memo,
+    'spill': bench_spill,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--macro', type=str2bool, default=True)
+    parser.add_argument('--limit', type=int, default=20000)
+    parser.add_argument('--folder', type=str, default='warehouses')
+    parser.add_argument('--spill', type=int, default=1000)
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](sorted(glob.glob(f'{args.folder}/*.txt')), args)
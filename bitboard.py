@@ -0,0 +1,185 @@
+'''
+Bitboard state engine for SokobanPuzzle.
+
+The cells of the warehouse are linearised as index = y * width + x and every
+set of cells (walls, taboo cells, targets, boxes) is stored as a Python int
+where bit i is set when cell i belongs to the set.
+A state is the pair (worker_index, boxes_mask), which is canonical and hashes
+in constant time.
+
+Moving a whole set of cells one step in a direction is a single shift,
+so flood-fill reachability, push generation and the goal test are all
+shift/mask operations instead of loops over sets of (x, y) tuples.
+
+Select it with SokobanPuzzle(warehouse, engine='bitboard').
+'''
+
+
+def shift(mask, offset):
+    '''
+    move every cell of mask by offset (a linear index offset)
+    '''
+    return mask << offset if offset > 0 else mask >> -offset
+
+
+def iter_bits(mask):
+    '''
+    yield the index of every set bit of mask, lowest first
+    '''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def cells_to_mask(cells, width):
+    mask = 0
+    for (x, y) in cells:
+        mask |= 1 << (y * width + x)
+    return mask
+
+
+class Bitboard:
+    '''
+    Precomputed masks of a SokobanPuzzle and the state operations on them.
+    The methods mirror actions / result / goal_test of SokobanPuzzle and
+    return actions in exactly the same format.
+    '''
+
+    def __init__(self, puzzle):
+        X, Y = zip(*puzzle.walls)
+        # one spare column so that a shift never wraps an interior cell onto the next row
+        self.width = width = 2 + max(X)
+        self.macro = puzzle.macro
+        self.allow_taboo_push = puzzle.allow_taboo_push
+        self.walls = cells_to_mask(puzzle.walls, width)
+        self.floor = cells_to_mask(puzzle.interior_cells, width)
+        self.targets = cells_to_mask(puzzle.targets, width)
+        # cells a box must not be pushed onto: taboo cells and cells with no reachable target
+        self.taboo = cells_to_mask(puzzle.taboo_cells | puzzle.dead_cells, width)
+        # direction name -> linear offset, in the same order as puzzle.directions
+        self.offsets = {direction: dy * width + dx for direction, (dx, dy) in puzzle.directions.items()}
+
+    def encode(self, worker, boxes):
+        '''
+        (worker, boxes) with (x, y) cells -> (worker_index, boxes_mask)
+        '''
+        x, y = worker
+        return y * self.width + x, cells_to_mask(boxes, self.width)
+
+    def decode(self, state):
+        '''
+        (worker_index, boxes_mask) -> (worker, boxes) with (x, y) cells
+        '''
+        worker, boxes = state
+        return self.cell(worker), tuple(sorted(self.cell(i) for i in iter_bits(boxes)))
+
+    def cell(self, index):
+        y, x = divmod(index, self.width)
+        return x, y
+
+    def reachable(self, worker, boxes):
+        '''
+        mask of the cells the worker can walk to without pushing a box
+        '''
+        free = self.floor & ~boxes
+        width = self.width
+        reach = 1 << worker
+        while True:
+            grown = reach | ((reach << 1 | reach >> 1 | reach << width | reach >> width) & free)
+            if grown == reach:
+                return reach
+            reach = grown
+
+    def canonical_worker(self, worker, boxes):
+        '''
+        index of the top-left-most reachable cell, i.e. the lowest bit of the region
+        '''
+        reach = self.reachable(worker, boxes)
+        return (reach & -reach).bit_length() - 1
+
+    def blocked_destinations(self, boxes):
+        '''
+        mask of cells a box must not be pushed onto
+        '''
+        blocked = self.walls | boxes
+        if not self.allow_taboo_push:
+            blocked |= self.taboo
+        return blocked
+
+    def actions(self, state):
+        worker, boxes = state
+        blocked = self.blocked_destinations(boxes)
+        possible_actions = []
+
+        if self.macro:
+            reach = self.reachable(worker, boxes)
+            width = self.width
+            for direction, offset in self.offsets.items():
+                # boxes with the worker's cell behind them and a free cell in front of them
+                pushable = boxes & shift(reach, offset) & shift(~blocked, -offset)
+                for index in iter_bits(pushable):
+                    if self.allow_taboo_push or not self.is_box_frozen(index + offset, boxes ^ (1 << index)):
+                        row, column = divmod(index, width)
+                        possible_actions.append(((row, column), direction))
+        else:
+            for direction, offset in self.offsets.items():
+                next_worker = worker + offset
+                bit = 1 << next_worker
+                if bit & self.walls:
+                    continue
+                if bit & boxes:
+                    new_box = next_worker + offset
+                    if (1 << new_box) & blocked:
+                        continue
+                    if not self.allow_taboo_push and self.is_box_frozen(new_box, boxes ^ bit):
+                        continue
+                possible_actions.append(direction)
+        return possible_actions
+
+    def result(self, state, action):
+        worker, boxes = state
+        if self.macro:
+            (row, column), direction = action
+            box = row * self.width + column
+            boxes ^= (1 << box) | (1 << (box + self.offsets[direction]))
+            return self.canonical_worker(box, boxes), boxes
+        offset = self.offsets[action]
+        next_worker = worker + offset
+        bit = 1 << next_worker
+        if bit & boxes:
+            boxes ^= bit | (1 << (next_worker + offset))
+        return next_worker, boxes
+
+    def goal_test(self, state):
+        return state[1] & ~self.targets == 0
+
+    def is_box_frozen(self, box, boxes):
+        '''
+        the frozen box check of SokobanPuzzle.is_box_frozen on masks
+        box: index of the box that has just been pushed
+        boxes: mask of the other boxes
+        '''
+        # checked is shared by the whole recursion, like the checked_boxes set
+        return self._frozen(box, boxes | (1 << box), [0])
+
+    def _frozen(self, box, boxes, checked):
+        bit = 1 << box
+        if checked[0] & bit:
+            # Treat already checked boxes as walls to avoid circular checks
+            return True
+        checked[0] |= bit
+        walls, width = self.walls, self.width
+
+        up, down, left, right = box - width, box + width, box - 1, box + 1
+        if (walls >> up | walls >> down) & 1:
+            vertical_blocked = True
+        else:
+            vertical_blocked = (boxes >> up & 1 and self._frozen(up, boxes, checked)) or \
+                               (boxes >> down & 1 and self._frozen(down, boxes, checked))
+        if (walls >> left | walls >> right) & 1:
+            horizontal_blocked = True
+        else:
+            horizontal_blocked = (boxes >> left & 1 and self._frozen(left, boxes, checked)) or \
+                                 (boxes >> right & 1 and self._frozen(right, boxes, checked))
+        return bool(vertical_blocked and horizontal_blocked and not self.targets & bit)
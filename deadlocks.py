@@ -0,0 +1,240 @@
+'''
+Learned deadlock patterns, shared between warehouses and runs.
+
+A pattern is a SIZE x SIZE window of a warehouse written as a string of
+cell codes, row by row:
+    '#' wall (or outside the grid), '$' box, '*' box on a target,
+    '.' target, ' ' any other cell
+A window is dead when its boxes can never all end up on targets, whatever
+the rest of the warehouse looks like. This is proven by a small search
+on the window alone, where every cell around the window is free floor
+reachable by the worker and a box pushed out of the window counts as
+solved. Anything outside the window can only add walls and boxes, so a
+window dead on its own is dead in every warehouse.
+
+The windows searched so far, dead or not, are stored in a canonical form,
+the smallest of their 8 rotations and reflections, and indexed under all
+8 so that a lookup is one set membership test and a window is searched
+at most once. DeadlockDB.save merges them into a JSON file that the next
+run loads, e.g.
+
+    deadlocks = DeadlockDB('./deadlocks.json')
+    solver = SokobanPuzzle(warehouse, macro=True, deadlocks=deadlocks)
+    ...
+    deadlocks.save()
+'''
+import json
+import operator
+import os
+import tempfile
+from collections import deque
+
+SIZE = 3
+CELLS = [(x, y) for y in range(SIZE) for x in range(SIZE)]
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+def symmetries():
+    '''
+    the 8 rotations and reflections of a window, as tuples 'order' where
+    cell i of the transformed window is cell order[i] of the window
+    '''
+    last = SIZE - 1
+    result = []
+    for rotate in (lambda x, y: (x, y), lambda x, y: (last - y, x),
+                   lambda x, y: (last - x, last - y), lambda x, y: (y, last - x)):
+        for reflect in (lambda x, y: (x, y), lambda x, y: (last - x, y)):
+            order = [None] * len(CELLS)
+            for index, cell in enumerate(CELLS):
+                x, y = reflect(*rotate(*cell))
+                order[y * SIZE + x] = index
+            result.append(tuple(order))
+    return result
+
+
+SYMMETRIES = symmetries()
+
+
+def variants(pattern):
+    '''
+    the set of the 8 rotations and reflections of pattern
+    '''
+    return {''.join(pattern[index] for index in order) for order in SYMMETRIES}
+
+
+def canonical(pattern):
+    return min(variants(pattern))
+
+
+def is_dead_window(pattern, limit=20000):
+    '''
+    True if the boxes of the window can never all reach targets, see the
+    module docstring. The search is bounded by 'limit' box layouts, past
+    which the window is not considered dead.
+    '''
+    walls, targets, boxes = set(), set(), set()
+    for index, code in enumerate(pattern):
+        cell = CELLS[index]
+        if code == '#':
+            walls.add(cell)
+        if code in '.*':
+            targets.add(cell)
+        if code in '$*':
+            boxes.add(cell)
+
+    def inside(cell):
+        return 0 <= cell[0] < SIZE and 0 <= cell[1] < SIZE
+
+    def region(start, boxes):
+        # the cells of the window and of the ring of floor around it reachable from start
+        seen = {start}
+        to_check = [start]
+        while to_check:
+            x, y = to_check.pop()
+            for dx, dy in DIRECTIONS:
+                cell = (x + dx, y + dy)
+                if cell in seen or cell in walls or cell in boxes or not -1 <= cell[0] <= SIZE \
+                        or not -1 <= cell[1] <= SIZE:
+                    continue
+                seen.add(cell)
+                to_check.append(cell)
+        return seen
+
+    def solved(boxes):
+        return boxes <= targets
+
+    boxes = frozenset(boxes)
+    if solved(boxes):
+        return False
+    # one start per region of the worker, it may be anywhere
+    start_states = []
+    covered = set()
+    for cell in [(-1, -1)] + CELLS:
+        if cell not in covered and cell not in walls and cell not in boxes:
+            cells = region(cell, boxes)
+            covered |= cells
+            start_states.append((boxes, min(cells)))
+    seen = set(start_states)
+    frontier = deque(start_states)
+    while frontier:
+        if len(seen) > limit:
+            return False
+        boxes, worker = frontier.popleft()
+        reachable = region(worker, boxes)
+        for (x, y) in boxes:
+            for dx, dy in DIRECTIONS:
+                new_box = (x + dx, y + dy)
+                if (x - dx, y - dy) not in reachable or new_box in walls or new_box in boxes:
+                    continue
+                new_boxes = boxes - {(x, y)}
+                if inside(new_box):
+                    new_boxes = new_boxes | {new_box}
+                if solved(new_boxes):
+                    return False
+                state = (new_boxes, min(region((x, y), new_boxes)))
+                if state not in seen:
+                    seen.add(state)
+                    frontier.append(state)
+    return True
+
+
+class DeadlockDB:
+    '''
+    The windows searched so far, optionally loaded from and saved to 'path'.
+    patterns: canonical form -> True if the window is dead
+    dead, alive: every orientation of the dead and of the other windows
+    limit: the bound of is_dead_window
+    '''
+
+    def __init__(self, path=None, limit=20000):
+        self.path = path
+        self.limit = limit
+        self.patterns = {}
+        self.dead = set()
+        self.alive = set()
+        if path and os.path.exists(path):
+            for pattern, dead in self.read(path).items():
+                self.add(pattern, dead)
+
+    @staticmethod
+    def read(path):
+        '''
+        return the canonical form -> dead dict saved in the file at path
+        '''
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('size') != SIZE:
+            raise ValueError(f'{path}: patterns of size {data.get("size")}, expected {SIZE}')
+        patterns = dict.fromkeys(data['alive'], False)
+        patterns.update(dict.fromkeys(data['dead'], True))
+        return patterns
+
+    def add(self, pattern, dead):
+        self.patterns[canonical(pattern)] = dead
+        (self.dead if dead else self.alive).update(variants(pattern))
+
+    def is_dead(self, pattern):
+        '''
+        True if the window is dead, searching it the first time it is seen
+        '''
+        if pattern in self.dead:
+            return True
+        if pattern in self.alive:
+            return False
+        dead = is_dead_window(pattern, self.limit)
+        self.add(pattern, dead)
+        return dead
+
+    def save(self, path=None):
+        '''
+        merge the patterns into the file at path (self.path by default),
+        keeping the patterns other runs saved there in the meantime
+        '''
+        path = path or self.path
+        patterns = self.read(path) if os.path.exists(path) else {}
+        patterns.update(self.patterns)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'size': SIZE,
+                       'dead': sorted(pattern for pattern, dead in patterns.items() if dead),
+                       'alive': sorted(pattern for pattern, dead in patterns.items() if not dead)}, f, indent=0)
+        os.replace(temporary, path)
+
+
+def neighbourhood(box, walls, boxes, targets, x_size, y_size):
+    '''
+    the cell codes of the (2 * SIZE - 1) square centred on box, row by row,
+    the union of the windows containing box
+    '''
+    bx, by = box
+    codes = []
+    for y in range(by - SIZE + 1, by + SIZE):
+        for x in range(bx - SIZE + 1, bx + SIZE):
+            if (x, y) in walls or not (0 <= x < x_size and 0 <= y < y_size):
+                codes.append('#')
+            elif (x, y) in boxes:
+                codes.append('*' if (x, y) in targets else '$')
+            else:
+                codes.append('.' if (x, y) in targets else ' ')
+    return codes
+
+
+# the cells of every window containing the centre of a neighbourhood
+WINDOWS = [operator.itemgetter(*[(y0 + y) * (2 * SIZE - 1) + x0 + x for y in range(SIZE) for x in range(SIZE)])
+           for y0 in range(SIZE) for x0 in range(SIZE)]
+
+
+def creates_deadlock(db, box, walls, boxes, targets, x_size, y_size):
+    '''
+    True if one of the windows around 'box', a box just pushed, is dead
+    Windows with a single box are left to the taboo cells.
+    '''
+    bx, by = box
+    if not any(abs(x - bx) < SIZE and abs(y - by) < SIZE for x, y in boxes if (x, y) != box):
+        return False
+    codes = neighbourhood(box, walls, boxes, targets, x_size, y_size)
+    for cells in WINDOWS:
+        pattern = ''.join(cells(codes))
+        if '$' in pattern and pattern.count('$') + pattern.count('*') > 1 and db.is_dead(pattern):
+            return True
+    return False
@@ -1,12 +1,12 @@
 # load everything needed for testing
-from mySokobanSolver import *
+from batch import solve_many
 from testlib import *
 
-all_warehouses = sorted(glob.glob('warehouses/*.txt'))
+if __name__ == '__main__':
+    all_warehouses = sorted(glob.glob('warehouses/*.txt'))
 
-for problem_file in all_warehouses:
-    print(f'Testing {problem_file}')
-    s = time.time()
-    a = test_warehouse(problem_file, macro=True)
-    print(f'Answer: {a}')
-    print(f'Time taken: {time.time()-s :.3f} seconds')    
+    # the warehouses are solved in parallel, the results come in completion order
+    for result in solve_many(all_warehouses, macro=True):
+        print(f'Testing {result["house"]}')
+        print(f'Answer: {result["solution"] if result["status"] != "error" else result["error"]}')
+        print(f'Time taken: {result["duration"] :.3f} seconds')
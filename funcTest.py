@@ -9,6 +9,16 @@ test_check_elem_action_seq()
 test_solve_sokoban_elem()
 test_can_go_there()
 test_solve_sokoban_macro()
+test_indexed_priority_queue()
+test_incremental_assignment()
+test_static_analysis_taboo_cells()
+test_solve_sokoban_macro_bidirectional()
+test_solution_cache()
+test_solve_sokoban_elem_push_level()
+test_solve_sokoban_anytime()
+test_idastar_search()
+test_solve_sokoban_macro_tunnels()
+test_solve_sokoban_bitboard()
 
 # start = time.time()
 # a = test_warehouse('./warehouses/warehouse_0035.txt', macro=True)
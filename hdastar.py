@@ -0,0 +1,254 @@
+'''
+Hash-distributed A* (HDA*) over several processes.
+
+Every worker process owns the states whose hash modulo the number of
+workers is its index, and runs A* on the states it owns: it keeps their
+best g value and parent, and has its own open list. The children of an
+expanded node are sent to their owners, in batches per owner, through one
+inbox queue per worker.
+
+The cost of the best goal found so far (the incumbent) is shared, and
+nodes with f = g + h no smaller than it are pruned. The search is over
+when every worker is idle (no open node better than the incumbent) and no
+batch is in flight. This is detected with the four counter method: two
+consecutive reads of the sent and received batch counters must be equal
+and all workers idle both times. With an admissible h the incumbent is then
+optimal.
+
+The path is rebuilt at the end by asking the owner of each state for its
+parent, from the goal back to the initial state.
+
+The parent raises RuntimeError when a worker process dies, and
+search.BudgetExhausted when the optional time limit runs out.
+
+Usage:
+    python ./hdastar.py --house ./warehouses/warehouse_0051.txt --macro true --workers 8
+'''
+import argparse
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+from search import BudgetExhausted, Node
+
+
+def owner(state, workers):
+    '''
+    the index of the worker owning state
+    The hash of a state must be the same in every process: states made of
+    ints and tuples are fine, strings are not (hash randomization).
+    '''
+    return hash(state) % workers
+
+
+def hda_worker(index, make_problem, args, kwargs, inboxes, results, incumbent, sent, received, idle, batch_size):
+    '''
+    the main loop of worker 'index', see the module docstring
+    inbox messages:
+        ('nodes', [(state, g, parent_state, action), ...])
+        ('parent', state): reply ('parent', parent_state, action) on results
+        ('stop',)
+    '''
+    problem = make_problem(*args, **kwargs)
+    workers = len(inboxes)
+    inbox = inboxes[index]
+    best_g = {}  # state -> best g value reached
+    parents = {}  # state -> (parent state, action) of that g value
+    h_values = {}
+    open_list = []  # entries (f, -g, counter, state, g)
+    counter = itertools.count()
+    outgoing = [[] for _ in range(workers)]
+    expansions = 0
+
+    def flush(destination):
+        if outgoing[destination]:
+            sent[index] += 1
+            inboxes[destination].put(('nodes', outgoing[destination]))
+            outgoing[destination] = []
+
+    def insert(state, g, parent, action):
+        if g >= best_g.get(state, float('inf')):
+            return
+        h = h_values.get(state)
+        if h is None:
+            h = h_values[state] = problem.h(Node(state))
+        if g + h >= incumbent.value:
+            return
+        best_g[state] = g
+        parents[state] = (parent, action)
+        heapq.heappush(open_list, (g + h, -g, next(counter), state, g))
+
+    while True:
+        # read every waiting message, block for a while when there is nothing to do
+        message = None
+        try:
+            if open_list and open_list[0][0] < incumbent.value:
+                message = inbox.get_nowait()
+            else:
+                for destination in range(workers):
+                    flush(destination)
+                idle[index] = 1
+                message = inbox.get(timeout=0.01)
+        except queue.Empty:
+            pass
+        if message is not None:
+            kind = message[0]
+            if kind == 'stop':
+                return
+            if kind == 'parent':
+                results.put(('parent',) + parents[message[1]])
+                continue
+            idle[index] = 0
+            for state, g, parent, action in message[1]:
+                insert(state, g, parent, action)
+            received[index] += 1
+            continue
+
+        if not open_list or open_list[0][0] >= incumbent.value:
+            continue
+        idle[index] = 0
+        f, _, _, state, g = heapq.heappop(open_list)
+        if g > best_g[state]:
+            continue  # stale entry
+        expansions += 1
+        if expansions % batch_size == 0:
+            # do not let the other workers wait for a full batch
+            for destination in range(workers):
+                flush(destination)
+        if problem.goal_test(state):
+            with incumbent.get_lock():
+                if g < incumbent.value:
+                    incumbent.value = g
+                    results.put(('goal', g, state))
+            continue
+        for action in problem.actions(state):
+            child = problem.result(state, action)
+            child_g = problem.path_cost(g, state, action, child)
+            destination = owner(child, workers)
+            if destination == index:
+                insert(child, child_g, state, action)
+            else:
+                outgoing[destination].append((child, child_g, state, action))
+                if len(outgoing[destination]) >= batch_size:
+                    flush(destination)
+
+
+def hda_star_search(make_problem, args=(), kwargs=None, workers=None, batch_size=64, time_limit=None):
+    '''
+    HDA* on the problem built by make_problem(*args, **kwargs) in every
+    worker process (make_problem and its arguments must be picklable).
+    The problem must return the actions of a state every time it is asked
+    and have an h(node) that only depends on node.state.
+    workers: the number of worker processes, os.cpu_count() by default
+    batch_size: the number of nodes sent to another worker in one message
+    time_limit: seconds, None for no limit
+    return None if there is no solution, otherwise (cost, actions)
+    raise RuntimeError if a worker dies, BudgetExhausted past the time limit
+    '''
+    deadline = None if time_limit is None else time.time() + time_limit
+    workers = workers or os.cpu_count()
+    kwargs = kwargs or {}
+    initial = make_problem(*args, **kwargs).initial
+    inboxes = [multiprocessing.Queue() for _ in range(workers)]
+    results = multiprocessing.Queue()
+    incumbent = multiprocessing.Value('d', float('inf'))
+    # one slot per worker, the last sent slot counts the batch of the initial state
+    sent = multiprocessing.Array('q', workers + 1, lock=False)
+    received = multiprocessing.Array('q', workers, lock=False)
+    idle = multiprocessing.Array('b', workers, lock=False)
+    processes = [multiprocessing.Process(
+        target=hda_worker,
+        args=(i, make_problem, args, kwargs, inboxes, results, incumbent, sent, received, idle, batch_size),
+        daemon=True) for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    def check():
+        for i, process in enumerate(processes):
+            if process.exitcode is not None:
+                raise RuntimeError(f'HDA* worker {i} exited with code {process.exitcode}')
+        if deadline is not None and time.time() > deadline:
+            raise BudgetExhausted(f'HDA* ran out of its {time_limit}s')
+
+    def receive(kind):
+        # the next message of this kind on results, without waiting forever on a dead worker
+        while True:
+            try:
+                message = results.get(timeout=0.1)
+            except queue.Empty:
+                check()
+                continue
+            if message[0] == kind:
+                return message
+
+    try:
+        sent[workers] = 1
+        inboxes[owner(initial, workers)].put(('nodes', [(initial, 0, None, None)]))
+
+        # four counter termination detection
+        previous = None
+        while True:
+            time.sleep(0.01)
+            check()
+            snapshot = (all(idle), sum(received), sum(sent))
+            if snapshot[0] and snapshot[1] == snapshot[2] and snapshot == previous:
+                break
+            previous = snapshot
+
+        if incumbent.value == float('inf'):
+            return None
+        goal_cost, goal = None, None
+        while goal_cost != incumbent.value:
+            _, goal_cost, goal = receive('goal')
+
+        # rebuild the path from the parents kept by the owners
+        actions = []
+        state = goal
+        while state != initial:
+            inboxes[owner(state, workers)].put(('parent', state))
+            _, state, action = receive('parent')
+            actions.append(action)
+        actions.reverse()
+        return goal_cost, actions
+    finally:
+        for inbox in inboxes:
+            inbox.put(('stop',))
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+
+def solve_sokoban_parallel(warehouse, macro=True, workers=None, time_limit=None):
+    '''
+    solve the warehouse with HDA* over 'workers' processes
+    return 'Impossible' or the list of actions, elementary or macro, like
+    solve_sokoban_elem / solve_sokoban_macro
+    raise BudgetExhausted if time_limit seconds pass first
+    '''
+    from mySokobanSolver import SokobanPuzzle
+    found = hda_star_search(SokobanPuzzle, (warehouse,), dict(macro=macro, history_check=False), workers,
+                            time_limit=time_limit)
+    return 'Impossible' if found is None else found[1]
+
+
+if __name__ == '__main__':
+    from runner import str2bool
+    from sokoban import Warehouse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--house', type=str)
+    parser.add_argument('--macro', type=str2bool, default=True)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--time-limit', type=float, default=None)
+    args = parser.parse_args()
+
+    house = Warehouse()
+    house.load_warehouse(args.house)
+    start = time.time()
+    solution = solve_sokoban_parallel(house, args.macro, args.workers, args.time_limit)
+    print(json.dumps({'duration': time.time() - start, 'solution': str(solution)}))
@@ -8,11 +8,24 @@ You are not allowed to change the defined interfaces.
 That is, changing the formal parameters of a function will break the 
 interface and triggers to a fail for the test of your code.
 '''
+import bisect
 import math
+import struct
 
 import search
+from collections import OrderedDict
+from assignment import IncrementalAssignment, greedy_assignment, min_cost_assignment, perfect_matching, \
+    repair_matching
+from bitboard import Bitboard
+from deadlocks import creates_deadlock
+from transposition import DiskBackedSet
+from zobrist import ZobristTable
 from collections import deque
 
+# above this many boxes, an assignment solved from scratch (incremental_h off, or the pull
+# heuristic of the bidirectional search) is greedy instead of the O(n^3) Hungarian algorithm
+HUNGARIAN_LIMIT = 12
+
 
 def my_team():
     '''
@@ -123,6 +136,78 @@ def scan_warehouse(warehouse):
     return interior_cells, taboo, grid
 
 
+def articulation_cells(cells):
+    '''
+    return the cells whose removal disconnects the other cells of 'cells'
+    (4-connected), found with an iterative Tarjan depth-first search
+    '''
+    order, low, result = {}, {}, set()
+    for root in cells:
+        if root in order:
+            continue
+        order[root] = low[root] = len(order)
+        root_children = 0
+        stack = [(root, None, iter([(0, 1), (1, 0), (0, -1), (-1, 0)]))]
+        while stack:
+            cell, parent, directions = stack[-1]
+            for dx, dy in directions:
+                neighbour = (cell[0] + dx, cell[1] + dy)
+                if neighbour not in cells or neighbour == parent:
+                    continue
+                if neighbour in order:
+                    low[cell] = min(low[cell], order[neighbour])
+                else:
+                    order[neighbour] = low[neighbour] = len(order)
+                    stack.append((neighbour, cell, iter([(0, 1), (1, 0), (0, -1), (-1, 0)])))
+                    break
+            else:
+                stack.pop()
+                if parent is None:
+                    continue
+                low[parent] = min(low[parent], low[cell])
+                if parent == root:
+                    root_children += 1
+                elif low[cell] >= order[parent]:
+                    result.add(parent)
+        if root_children > 1:
+            result.add(root)
+    return result
+
+
+def scan_tunnels(warehouse, interior_cells):
+    '''
+    the tunnel analysis complementing scan_warehouse
+    A tunnel cell for a push direction is an articulation cell of the
+    interior with walls on both sides across that direction: a box pushed
+    there blocks the only way between two parts of the warehouse, and can
+    only be pushed on.
+    return a dict direction name -> set of tunnel cells, and the set of
+    articulation cells
+    '''
+    walls = set(warehouse.walls)
+    articulations = articulation_cells(interior_cells)
+    horizontal = {(x, y) for x, y in articulations if (x, y - 1) in walls and (x, y + 1) in walls}
+    vertical = {(x, y) for x, y in articulations if (x - 1, y) in walls and (x + 1, y) in walls}
+    return {'Left': horizontal, 'Right': horizontal, 'Up': vertical, 'Down': vertical}, articulations
+
+
+def expand_tunnel_actions(actions):
+    '''
+    replace every compound push ((r, c), direction, pushes) of a macro
+    solution by its single pushes ((r, c), direction)
+    '''
+    directions = {'Left': (0, -1), 'Right': (0, 1), 'Up': (-1, 0), 'Down': (1, 0)}
+    expanded = []
+    for action in actions:
+        if len(action) == 3:
+            (r, c), direction, pushes = action
+            dr, dc = directions[direction]
+            expanded.extend(((r + k * dr, c + k * dc), direction) for k in range(pushes))
+        else:
+            expanded.append(action)
+    return expanded
+
+
 def taboo_cells(warehouse):
     '''  
     Identify the taboo cells of a warehouse. A cell inside a warehouse is 
@@ -151,6 +236,209 @@ def taboo_cells(warehouse):
     return "\n".join(["".join(line) for line in grid])
 
 
+def push_distances(interior_cells, targets):
+    '''
+    For every interior cell, the minimum number of pushes that brings a box
+    from that cell onto each target when there are no other boxes.
+    Computed with one reverse BFS of box pulls per target: a box on cell p
+    can be pulled to p + d if both p + d and the worker cell p + 2d are inside.
+    targets: a sequence of target cells
+    return a dict cell -> tuple of distances, one per target in the given order
+           (math.inf when the target cannot be reached)
+    '''
+    columns = []
+    for target in targets:
+        distance = {target: 0}
+        queue = deque([target])
+        while queue:
+            x, y = queue.popleft()
+            for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+                box = (x + dx, y + dy)
+                if box not in distance and box in interior_cells and (x + 2 * dx, y + 2 * dy) in interior_cells:
+                    distance[box] = distance[(x, y)] + 1
+                    queue.append(box)
+        columns.append(distance)
+    return {cell: tuple(column.get(cell, math.inf) for column in columns) for cell in interior_cells}
+
+
+def pull_distances(interior_cells, sources):
+    '''
+    For every interior cell, the minimum number of pulls that brings a box
+    from that cell back onto each source when there are no other boxes,
+    i.e. the pushes from the source to the cell.
+    Computed with one BFS of box pushes per source: a box on cell p can be
+    pushed to p + d if both p + d and the worker cell p - d are inside.
+    sources: a sequence of cells, usually the initial boxes
+    return a dict cell -> tuple of distances, one per source in the given order
+    '''
+    columns = []
+    for source in sources:
+        distance = {source: 0}
+        queue = deque([source])
+        while queue:
+            x, y = queue.popleft()
+            for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+                box = (x + dx, y + dy)
+                if box not in distance and box in interior_cells and (x - dx, y - dy) in interior_cells:
+                    distance[box] = distance[(x, y)] + 1
+                    queue.append(box)
+        columns.append(distance)
+    return {cell: tuple(column.get(cell, math.inf) for column in columns) for cell in interior_cells}
+
+
+def reachable_cells(worker, walls, boxes, known=frozenset()):
+    '''
+    return a set including all the cells the worker can walk to without pushing a box
+    walls, boxes: sets of (x, y) cells
+    known: cells already known to be reachable, they are neither expanded nor returned
+    '''
+    queue = deque([worker])
+    visited = {worker}
+
+    while queue:
+        x, y = queue.popleft()
+
+        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+            next_pos = (x + dx, y + dy)
+
+            if next_pos not in visited and next_pos not in known and next_pos not in walls and next_pos not in boxes:
+                visited.add(next_pos)
+                queue.append(next_pos)
+    return visited
+
+
+def walking_path(worker, goal, walls, boxes):
+    '''
+    return a shortest list of elementary actions walking the worker to goal
+    without pushing a box, or None if goal cannot be reached
+    walls, boxes: sets of (x, y) cells
+    '''
+    queue = deque([worker])
+    parents = {worker: None}  # cell -> (previous cell, action), as in reachable_cells
+
+    while queue and goal not in parents:
+        x, y = queue.popleft()
+
+        for dx, dy, action in [(0, 1, 'Down'), (1, 0, 'Right'), (0, -1, 'Up'), (-1, 0, 'Left')]:
+            next_pos = (x + dx, y + dy)
+
+            if next_pos not in parents and next_pos not in walls and next_pos not in boxes:
+                parents[next_pos] = ((x, y), action)
+                queue.append(next_pos)
+
+    if goal not in parents:
+        return None
+    path = []
+    while parents[goal] is not None:
+        goal, action = parents[goal]
+        path.append(action)
+    return path[::-1]
+
+
+def stitch_pushes(warehouse, macro_actions):
+    '''
+    return the elementary actions of a macro solution of the warehouse:
+    every push ((r, c), direction) is preceded by a shortest walk to the
+    cell behind the box
+    '''
+    directions = {'Left': (-1, 0), 'Right': (1, 0), 'Up': (0, -1), 'Down': (0, 1)}
+    walls = set(warehouse.walls)
+    boxes = set(warehouse.boxes)
+    worker = warehouse.worker
+    actions = []
+    for (r, c), direction in macro_actions:
+        dx, dy = directions[direction]
+        box = (c, r)
+        actions.extend(walking_path(worker, (c - dx, r - dy), walls, boxes))
+        actions.append(direction)
+        boxes.remove(box)
+        boxes.add((c + dx, r + dy))
+        worker = box
+    return actions
+
+
+def moved_box(boxes, box, new_box):
+    '''
+    return the sorted tuple boxes where the box on 'box' is moved to 'new_box'
+    '''
+    boxes = list(boxes)
+    boxes.remove(box)
+    bisect.insort(boxes, new_box)
+    return tuple(boxes)
+
+
+def connected_cells(start, cells):
+    '''
+    return the cells of 'cells' connected to start, start included
+    '''
+    queue = deque([start])
+    visited = {start}
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+            next_pos = (x + dx, y + dy)
+            if next_pos not in visited and next_pos in cells:
+                visited.add(next_pos)
+                queue.append(next_pos)
+    return visited
+
+
+def top_left(region):
+    '''
+    return the top-left-most cell (smallest row, then column) of a region
+    '''
+    return min(region, key=lambda cell: (cell[1], cell[0]))
+
+
+class ReachabilityCache:
+    '''
+    A bounded cache of worker regions with LRU eviction.
+    A key is a box configuration (a sorted tuple of boxes) and its value is the
+    list of regions already computed for it, so any worker cell inside a
+    known region is a hit.
+    The cached regions are shared, callers must not modify them.
+    '''
+
+    def __init__(self, capacity=20000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, worker, key):
+        '''
+        return the cached region of key containing worker, or None
+        '''
+        regions = self.entries.get(key)
+        if regions is not None:
+            for region in regions:
+                if worker in region:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return region
+        self.misses += 1
+        return None
+
+    def put(self, key, region):
+        regions = self.entries.get(key)
+        if regions is None:
+            self.entries[key] = [region]
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        else:
+            regions.append(region)
+            self.entries.move_to_end(key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self.entries),
+        }
+
+
 class SokobanPuzzle(search.Problem):
     '''
     An instance of the class 'SokobanPuzzle' represents a Sokoban puzzle.
@@ -178,26 +466,73 @@ class SokobanPuzzle(search.Problem):
     macro actions. If self.macro is set False, the 'actions' function should 
     return elementary actions.
     
-    
+    The state engine is selected with 'engine':
+    - 'tuple': states are (worker, boxes) with (x, y) cells (default)
+    - 'bitboard': states are (worker_index, boxes_mask), see bitboard.py
+    Both engines return the same action formats.
+    With the tuple engine and zobrist=True, states are ZobristState objects,
+    (worker, boxes) pairs whose hash is updated incrementally.
+    With the tuple engine, a deadlocks.DeadlockDB passed as 'deadlocks'
+    rejects the pushes that leave a dead pattern around the pushed box.
+    With the tuple engine in macro mode, corral_pruning=True restricts the
+    actions to the pushes into a PI-corral, see pi_corral_pushes. It keeps
+    every solvable state solvable but the solutions may be longer.
+    With the tuple engine in macro mode, tunnel_macros=True pushes a box
+    through a tunnel (see scan_tunnels) in one compound action
+    ((r, c), direction, pushes) costing its number of pushes,
+    expand_actions turns a solution back into single pushes.
+    With the tuple engine, matching_check=True (default) also rejects the
+    pushes after which the boxes cannot be matched to distinct targets
+    they can each still reach, see keeps_matching.
+    With the tuple engine, incremental_h=True (default) derives the box
+    assignment of h from the one of the parent node, see box_assignment,
+    and check_incremental_h=True compares it with a full computation.
     '''
 
-    def __init__(self, warehouse, macro=False, allow_taboo_push=False, history_check=True):
+    def __init__(self, warehouse, macro=False, allow_taboo_push=False, history_check=True, engine='tuple',
+                 reachability_cache_size=20000, zobrist=False, deadlocks=None, corral_pruning=False,
+                 corral_limit=100, corral_cache_size=10000, tunnel_macros=False, matching_check=True,
+                 matching_cache_size=100000, incremental_h=True, check_incremental_h=False,
+                 assignment_cache_size=50000):
         """
         Initializes the Sokoban puzzle.
 
         :param warehouse: A valid Warehouse object.
         :param macro: If True, use macro actions (moving boxes directly). If False, use elementary actions (worker moves).
         :param allow_taboo_push: If True, allow moves that push a box into a taboo cell. If False, such moves are not allowed.
+        :param engine: 'tuple' or 'bitboard', the representation of states.
+        :param reachability_cache_size: the number of box configurations whose worker regions are cached.
+        :param zobrist: If True, the tuple engine uses ZobristState states with a cached hash.
+        :param deadlocks: A deadlocks.DeadlockDB of dead box patterns, learned and used by the tuple engine.
+        :param corral_pruning: If True, the tuple engine in macro mode only pushes into PI-corrals when there is one.
+        :param corral_limit: the number of box layouts searched to prove a PI-corral deadlocked.
+        :param corral_cache_size: the number of those searches whose result is cached.
+        :param tunnel_macros: If True, the tuple engine in macro mode pushes boxes through tunnels in one action.
+        :param matching_check: If True, the tuple engine rejects pushes leaving no box to target perfect matching.
+        :param matching_cache_size: the number of box configurations whose matching is cached.
+        :param incremental_h: If True, the tuple engine repairs the assignment of h from the parent's after a push.
+        :param check_incremental_h: If True, every repaired assignment is checked against a full computation.
+        :param assignment_cache_size: the number of box configurations whose assignment is cached.
         """
         self.warehouse = warehouse
         self.allow_taboo_push = allow_taboo_push
         self.macro = macro
         self.interior_cells, self.taboo_cells, _ = scan_warehouse(warehouse)
-        self.initial = (warehouse.worker, tuple(warehouse.boxes))
+        # states are (worker, boxes) where boxes is a sorted tuple, so the same
+        # box layout always hashes and compares as the same state
+        self.initial = (warehouse.worker, tuple(sorted(warehouse.boxes)))
         # walls won't change its position, use set to optimize performance
         self.walls = set(warehouse.walls)
         # target won't change its position, use set to optimize performance
         self.targets = set(warehouse.targets)
+        # push distances from every cell to every target, columns follow self.target_list
+        self.target_list = sorted(self.targets)
+        self.distances = push_distances(self.interior_cells, self.target_list)
+        # a box sealed off from the worker can never move, it only fits the target it stands on
+        for cell in set(warehouse.boxes) - self.interior_cells:
+            self.distances[cell] = tuple(0 if target == cell else math.inf for target in self.target_list)
+        # cells from which a box cannot reach any target, even with no other box around
+        self.dead_cells = {cell for cell, row in self.distances.items() if min(row, default=0) == math.inf}
         # Possible directions (dx, dy) and corresponding movement descriptions
         self.directions = {
             'Left': (-1, 0),
@@ -207,6 +542,50 @@ class SokobanPuzzle(search.Problem):
         }
         self.history = set()
         self.history_check = history_check
+        self.deadlocks = deadlocks
+        self.corral_pruning = corral_pruning
+        self.corral_limit = corral_limit
+        self.corral_cache_size = corral_cache_size
+        self.corral_cache = OrderedDict()  # (corral, boxes, worker) -> deadlocked, LRU order
+        self.tunnel_macros = tunnel_macros and macro
+        self.matching_check = matching_check and not allow_taboo_push
+        self.matching_cache_size = matching_cache_size
+        self.matchings = OrderedDict()  # boxes -> {box: target index} or None, LRU order
+        self.incremental_h = incremental_h
+        self.check_incremental_h = check_incremental_h
+        self.assignment_cache_size = assignment_cache_size
+        self.assignments = OrderedDict()  # boxes -> IncrementalAssignment, LRU order
+        # the targets every cell can still push a box to, the edges of the matching
+        self.target_edges = {cell: tuple(j for j, d in enumerate(row) if d != math.inf)
+                             for cell, row in self.distances.items()}
+        self.tunnels = scan_tunnels(warehouse, self.interior_cells)[0] if self.tunnel_macros else None
+        self.reachability = ReachabilityCache(reachability_cache_size)
+        self.bitboard = None
+        self.zobrist = None
+        if engine == 'bitboard':
+            if deadlocks is not None or corral_pruning or tunnel_macros:
+                raise ValueError('deadlock patterns, corral pruning and tunnel macros are only supported by the '
+                                 'tuple engine')
+            self.bitboard = Bitboard(self)
+            self.initial = self.bitboard.encode(*self.initial)
+        elif engine != 'tuple':
+            raise ValueError(f'unknown engine: {engine}')
+        if macro:
+            # macro states only keep a representative of the worker's region
+            worker, boxes = self.initial
+            self.initial = self.canonical_worker(worker, boxes), boxes
+        if zobrist and not self.bitboard:
+            self.zobrist = ZobristTable(self.interior_cells | set(warehouse.boxes))
+            self.initial = self.zobrist.state(*self.initial)
+        # fixed-size records of states for the disk-backed explored set
+        self.width = 1 + max(x for x, _ in self.walls)
+        self.height = 1 + max(y for _, y in self.walls)
+        if self.bitboard:
+            self.mask_bytes = (self.bitboard.width * (1 + max(y for _, y in self.walls)) + 7) // 8
+            self.packed_size = 2 + self.mask_bytes
+        else:
+            self.packer = struct.Struct(f'<{1 + len(warehouse.boxes)}H')
+            self.packed_size = self.packer.size
 
     def actions(self, state):
         """
@@ -221,20 +600,31 @@ class SokobanPuzzle(search.Problem):
                 return []
             self.history.add(state)
 
+        if self.bitboard:
+            return self.bitboard.actions(state)
+
         worker, boxes = state
         # the places of boxes are confirmed, use set to optimize performance
         boxes = set(boxes)
         possible_actions = []
 
         if self.macro:
-            reachable = self.get_reachable_range(worker, boxes)
+            reachable = self.get_reachable_range(worker, boxes, key=state[1])
             # Generate macro actions: Worker must be next to a box, and move that box.
             for (box_x, box_y) in boxes:
                 for direction, (dx, dy) in self.directions.items():
                     next_worker_pos = (box_x - dx, box_y - dy)
                     # is the new position reachable? can u push the box there?
                     if next_worker_pos in reachable and self.is_valid_elem_move(direction, (box_x, box_y), boxes):
-                        possible_actions.append(((box_y, box_x), direction))
+                        possible_actions.append(self.tunnel_push((box_x, box_y), direction, boxes)
+                                                if self.tunnels else ((box_y, box_x), direction))
+            if self.matching_check:
+                possible_actions = [action for action in possible_actions
+                                    if self.keeps_matching(state[1], *self.pushed_box(action))]
+            if self.corral_pruning and possible_actions:
+                corral_pushes = self.pi_corral_pushes(reachable, boxes)
+                if corral_pushes is not None:
+                    return [action for action in possible_actions if action[:2] in corral_pushes]
         else:
             # Elementary actions: Worker moves by one step
             for direction, (dx, dy) in self.directions.items():
@@ -242,6 +632,9 @@ class SokobanPuzzle(search.Problem):
 
                 # Check if the worker can move without obstacles
                 if self.is_valid_elem_move(direction, next_worker_pos, boxes):
+                    if self.matching_check and next_worker_pos in boxes and not self.keeps_matching(
+                            state[1], next_worker_pos, (next_worker_pos[0] + dx, next_worker_pos[1] + dy)):
+                        continue
                     possible_actions.append(direction)
         return possible_actions
 
@@ -249,22 +642,35 @@ class SokobanPuzzle(search.Problem):
         """
         Returns the resulting state after applying the given action to the given state.
         """
+        if self.bitboard:
+            return self.bitboard.result(state, action)
+
         worker, boxes = state
-        # the places of boxes are confirmed, use set to optimize performance
-        boxes = set(boxes)
+
+        if self.macro and len(action) == 3:
+            # compound push through a tunnel, one push at a time
+            (box_y, box_x), direction, pushes = action
+            dx, dy = self.directions[direction]
+            for k in range(pushes):
+                state = self.result(state, ((box_y + k * dy, box_x + k * dx), direction))
+            return state
 
         if self.macro:
             # Macro action: push a box
             (box_y, box_x), direction = action
             dx, dy = self.directions[direction]
+            box = (box_x, box_y)
             new_box_pos = (box_x + dx, box_y + dy)
-            new_worker_pos = (box_x, box_y)
+            # region the box is pushed from, normally cached by actions()
+            region = self.get_reachable_range(worker, boxes, key=boxes)
 
             # # Update box position
-            boxes.remove((box_x, box_y))
-            boxes.add(new_box_pos)
+            new_boxes = moved_box(boxes, box, new_box_pos)
 
-            return new_worker_pos, tuple(boxes)
+            # caches the new region, so that canonical_worker below is a cache hit
+            self.get_reachable_range_after_push(region, box, new_box_pos, new_boxes, new_boxes)
+            new_worker_pos = self.canonical_worker(box, new_boxes, key=new_boxes)
+            return self.new_state(state, new_worker_pos, new_boxes, box, new_box_pos)
         else:
             # Elementary action: move worker
             direction = action
@@ -274,16 +680,108 @@ class SokobanPuzzle(search.Problem):
             # If the worker pushes a box, move the box as well
             if new_worker_pos in boxes:
                 new_box_pos = (new_worker_pos[0] + dx, new_worker_pos[1] + dy)
-                boxes.remove(new_worker_pos)
-                boxes.add(new_box_pos)
+                new_boxes = moved_box(boxes, new_worker_pos, new_box_pos)
+                return self.new_state(state, new_worker_pos, new_boxes, new_worker_pos, new_box_pos)
+
+            return self.new_state(state, new_worker_pos, boxes)
+
+    def tunnel_push(self, box, direction, boxes):
+        '''
+        the action pushing 'box' in direction, a legal push: while the box
+        stands in a tunnel cell off target, it is pushed on, so the action
+        is ((r, c), direction, pushes) when it goes more than one cell
+        '''
+        (x, y), (dx, dy) = box, self.directions[direction]
+        tunnel = self.tunnels[direction]
+        boxes = set(boxes)
+        pushes = 1
+        boxes.remove((x, y))
+        x, y = x + dx, y + dy
+        boxes.add((x, y))
+        while (x, y) in tunnel and (x, y) not in self.targets and self.is_valid_elem_move(direction, (x, y), boxes):
+            boxes.remove((x, y))
+            x, y = x + dx, y + dy
+            boxes.add((x, y))
+            pushes += 1
+        if pushes == 1:
+            return (box[1], box[0]), direction
+        return (box[1], box[0]), direction, pushes
+
+    def pushed_box(self, action):
+        '''
+        return (box, new_box), the cells of the box a macro action pushes
+        before and after the action
+        '''
+        (box_y, box_x), direction = action[:2]
+        pushes = action[2] if len(action) == 3 else 1
+        dx, dy = self.directions[direction]
+        return (box_x, box_y), (box_x + pushes * dx, box_y + pushes * dy)
 
-            return new_worker_pos, tuple(boxes)
+    def box_matching(self, boxes):
+        '''
+        return a perfect matching {box: target index} of the boxes (a sorted
+        tuple) to targets they can each reach, or None when there is none
+        The matchings are cached by boxes, most are found by keeps_matching.
+        '''
+        if boxes in self.matchings:
+            self.matchings.move_to_end(boxes)
+            return self.matchings[boxes]
+        matching = perfect_matching(boxes, self.target_edges)
+        self.cache_matching(boxes, matching)
+        return matching
+
+    def cache_matching(self, boxes, matching):
+        self.matchings[boxes] = matching
+        if len(self.matchings) > self.matching_cache_size:
+            self.matchings.popitem(last=False)
+
+    def keeps_matching(self, boxes, box, new_box):
+        '''
+        True if the boxes (a sorted tuple) still have a perfect matching after
+        the box on 'box' is pushed to 'new_box'. The matching of the result is
+        repaired from the matching of boxes: the pushed box keeps its target
+        if it can still reach it, otherwise one augmenting path is searched.
+        '''
+        matching = self.box_matching(boxes)
+        if matching is None:
+            return False
+        new_matching = repair_matching(matching, box, new_box, self.target_edges)
+        self.cache_matching(moved_box(boxes, box, new_box), new_matching)
+        return new_matching is not None
+
+    def path_cost(self, c, state1, action, state2):
+        '''
+        one per push, a compound tunnel push costs its number of pushes
+        '''
+        if self.macro and len(action) == 3:
+            return c + action[2]
+        return c + 1
+
+    def expand_actions(self, actions):
+        '''
+        return a solution of this puzzle with the compound tunnel pushes
+        replaced by single pushes
+        '''
+        return expand_tunnel_actions(actions) if self.tunnel_macros else actions
+
+    def new_state(self, state, worker, boxes, box=None, new_box=None):
+        '''
+        return the successor of state with the given worker and boxes tuple,
+        where the box on 'box', if any, was pushed to 'new_box'
+        With zobrist enabled, the hash of state is updated incrementally.
+        '''
+        if self.zobrist:
+            return self.zobrist.moved(state, worker, boxes, box, new_box)
+        return worker, boxes
 
     def goal_test(self, state):
         """
         Returns True if the given state is a goal state.
         The goal state is when all boxes are on target cells.
         """
+        if self.bitboard:
+            return self.bitboard.goal_test(state)
+
         _, boxes = state
         return all(box in self.targets for box in boxes)
 
@@ -308,10 +806,16 @@ class SokobanPuzzle(search.Problem):
             # you cannot push a box to taboo cell
             if not self.allow_taboo_push:
                 # taboo cell deadlock check
-                if new_box in self.taboo_cells:
+                if new_box in self.taboo_cells or new_box in self.dead_cells:
                     return False
                 # frozen box check: refer http://sokobano.de/wiki/index.php?title=How_to_detect_deadlocks
-                if self.is_box_frozen(new_box, boxes, set()):
+                # judge the pushed box against the box layout after the push
+                new_boxes = (boxes - {next_pos}) | {new_box}
+                if self.is_box_frozen(new_box, new_boxes, set()):
+                    return False
+                # learned dead patterns of walls and boxes
+                if self.deadlocks is not None and creates_deadlock(self.deadlocks, new_box, self.walls, new_boxes,
+                                                                   self.targets, self.width, self.height):
                     return False
 
         return True
@@ -350,42 +854,327 @@ class SokobanPuzzle(search.Problem):
         # The box is frozen if it is blocked along both axes and not on a goal
         return vertical_blocked and horizontal_blocked and box not in self.targets
 
-    def get_reachable_range(self, worker, boxes):
+    def get_reachable_range(self, worker, boxes, key=None):
         '''
         return a set including all reachable locations for current worker and boxes
+        The regions are cached by box configuration (key, the sorted tuple of
+        boxes, computed if not given), the returned set must not be modified.
         '''
-        queue = deque([worker])
-        visited = {worker}
-
-        while queue:
-            cur_pos = queue.popleft()
+        if key is None:
+            key = tuple(sorted(boxes))
+        region = self.reachability.get(worker, key)
+        if region is None:
+            region = reachable_cells(worker, self.walls, set(boxes))
+            self.reachability.put(key, region)
+        return region
+
+    def get_reachable_range_after_push(self, region, box, new_box, boxes, key):
+        '''
+        return the worker region right after a push, updated incrementally
+        region: the region the box was pushed from
+        box: the cell the box left, where the worker now stands
+        new_box: the cell the box was pushed to
+        boxes, key: the boxes and their sorted tuple after the push
+        If the box was pushed outside the region, the region is still reachable
+        and only the cells opened up around the freed cell are flooded.
+        Otherwise the new box may split the region and it is flooded again.
+        '''
+        cached = self.reachability.get(box, key)
+        if cached is not None:
+            return cached
+        boxes = set(boxes)
+        if new_box in region:
+            new_region = reachable_cells(box, self.walls, boxes)
+        else:
+            new_region = region | reachable_cells(box, self.walls, boxes, known=region)
+        self.reachability.put(key, new_region)
+        return new_region
 
-            for (dx, dy) in self.directions.values():
-                next_pos = (cur_pos[0] + dx, cur_pos[1] + dy)
+    def pi_corral_pushes(self, reachable, boxes):
+        '''
+        A corral is an area the worker cannot reach, closed off by boxes. Its
+        boundary boxes are its boxes next to the worker's region. It is a
+        PI-corral when every legal push of a boundary box goes into the
+        corral (I) and can be done from the worker's region (P). When such a
+        corral still has a box off target or an empty target, some push into
+        it is needed sooner or later, and pushing anywhere else first does not
+        help, so only its pushes are kept.
+        reachable: the worker's region, boxes: the set of boxes
+        return None if there is no PI-corral, otherwise the set of pushes of
+        the PI-corral with the fewest pushes, empty if it is deadlocked
+        '''
+        best = None
+        unseen = (self.interior_cells | boxes) - reachable
+        while unseen:
+            corral = connected_cells(unseen.pop(), unseen)
+            unseen -= corral
+            if corral <= boxes or all(cell in boxes for cell in corral & self.targets) and \
+                    all(box in self.targets for box in corral & boxes):
+                continue  # no free cell inside, or nothing to do
+            pushes = self.corral_pushes(corral, reachable, boxes)
+            if pushes is not None and (best is None or len(pushes) < len(best[1])):
+                best = corral, pushes
+        if best is None:
+            return None
+        corral, pushes = best
+        if not pushes or self.is_corral_deadlocked(corral, reachable, boxes):
+            return set()
+        return pushes
+
+    def corral_pushes(self, corral, reachable, boxes):
+        '''
+        return the legal pushes of the boxes of the corral if it is a
+        PI-corral, None otherwise
+        '''
+        pushes = set()
+        for box_x, box_y in corral & boxes:
+            for direction, (dx, dy) in self.directions.items():
+                worker = (box_x - dx, box_y - dy)
+                if worker in self.walls or not self.is_valid_elem_move(direction, (box_x, box_y), boxes):
+                    continue
+                if worker in corral:
+                    continue  # a push from inside the corral, not possible yet
+                if worker not in reachable:
+                    return None  # not P: the worker cannot get behind the box
+                if (box_x + dx, box_y + dy) not in corral:
+                    return None  # not I: the box can be pushed out of the corral
+                pushes.add(((box_y, box_x), direction))
+        return pushes
+
+    def is_corral_deadlocked(self, corral, reachable, boxes):
+        '''
+        search the pushes of the boxes of the corral alone, the other boxes
+        removed, from the worker's region
+        return True if no box can leave the corral and the boxes of the
+        corral never all stand on targets, False if they can or the search
+        goes over self.corral_limit box layouts
+        The results are cached by corral and start state.
+        '''
+        corral_boxes = frozenset(corral & boxes)
+        start = (top_left(reachable_cells(top_left(reachable), self.walls, corral_boxes)), corral_boxes)
+        key = (frozenset(corral), start)
+        if key in self.corral_cache:
+            self.corral_cache.move_to_end(key)
+            return self.corral_cache[key]
+        deadlocked = self.corral_cache[key] = self.search_corral(corral, start)
+        if len(self.corral_cache) > self.corral_cache_size:
+            self.corral_cache.popitem(last=False)
+        return deadlocked
+
+    def search_corral(self, corral, start):
+        '''
+        the search of is_corral_deadlocked from start, a (worker, boxes) state
+        '''
+        blocked = self.walls if self.allow_taboo_push else self.walls | self.taboo_cells | self.dead_cells
+        seen = {start}
+        frontier = deque([(start[1], reachable_cells(start[0], self.walls, start[1]))])
+        while frontier:
+            if len(seen) > self.corral_limit:
+                return False
+            layout, region = frontier.popleft()
+            for box_x, box_y in layout:
+                for dx, dy in self.directions.values():
+                    new_box = (box_x + dx, box_y + dy)
+                    if (box_x - dx, box_y - dy) not in region or new_box in blocked or new_box in layout:
+                        continue
+                    if new_box not in corral:
+                        return False
+                    new_layout = layout - {(box_x, box_y)} | {new_box}
+                    if new_layout <= self.targets:
+                        return False
+                    new_region = reachable_cells((box_x, box_y), self.walls, new_layout)
+                    state = (top_left(new_region), new_layout)
+                    if state not in seen:
+                        seen.add(state)
+                        frontier.append((new_layout, new_region))
+        return True
 
-                if next_pos not in visited and next_pos not in self.walls and next_pos not in boxes:
-                    visited.add(next_pos)
-                    queue.append(next_pos)
-        return visited
+    def canonical_worker(self, worker, boxes, key=None):
+        '''
+        return the top-left-most cell (smallest row, then column) the worker can reach.
+        In macro mode only the region of the worker matters, so the states
+        with the same boxes and the worker anywhere in one region collapse
+        into the state keyed by this cell.
+        '''
+        if self.bitboard:
+            return self.bitboard.canonical_worker(worker, boxes)
+        return top_left(self.get_reachable_range(worker, boxes, key=key))
 
     def h(self, state):
         '''
         heuristic function for A*
-        return the sum of manhattan distance between boxes and the closest target
+        return the pushes of a minimum-cost assignment of boxes to distinct
+        targets, using the precomputed push distances, or math.inf if a box
+        can never reach a target. The assignment is repaired from the parent's
+        with incremental_h, otherwise it is solved again, greedily above
+        HUNGARIAN_LIMIT boxes.
+        In elementary mode, add the manhattan distance from the worker to a
+        cell next to the closest box that is not on a target.
+        'state' is the search node.
         '''
-        worker, boxes = state.state
-        boxes = set(boxes)
-        completes = self.targets & boxes
-        boxes = boxes.difference(completes)
-        targets = self.targets.difference(completes)
-        box_distance = 0
-        for box, target in zip(boxes, targets):
-            box_distance += math.isqrt((box[0] - target[0]) ** 2 + (box[1] - target[1]) ** 2)
+        worker, boxes = self.decode(state.state)
+        for box in boxes:
+            if box in self.dead_cells:
+                return math.inf
+        # O(targets^2) per node, cheaper than the greedy assignment above HUNGARIAN_LIMIT too
+        if self.incremental_h and len(boxes) <= len(self.targets):
+            box_distance = self.box_assignment(boxes, state).total
+        else:
+            cost = [self.distances[box] for box in boxes]
+            assign = min_cost_assignment if len(cost) <= HUNGARIAN_LIMIT else greedy_assignment
+            box_distance, _ = assign(cost)
         worker_distance = 0
-        if not self.macro and boxes:
-            worker_distance = min([abs(worker[0] - box[0]) + abs(worker[1] - box[1]) for box in boxes])
+        if not self.macro:
+            misplaced = [box for box in boxes if box not in self.targets]
+            if misplaced:
+                # the worker only has to reach a cell next to the box, the push is in box_distance
+                worker_distance = max(0, min([abs(worker[0] - box[0]) + abs(worker[1] - box[1])
+                                              for box in misplaced]) - 1)
         return box_distance + worker_distance
 
+    def box_assignment(self, boxes, node=None):
+        '''
+        return the IncrementalAssignment of boxes (a sorted tuple) to the
+        targets, cached by boxes
+        When node, the search node of boxes, has a parent that pushed a box,
+        the assignment is the parent's with the row of the pushed box
+        replaced, repaired in O(targets^2) instead of solved in O(boxes^2 targets).
+        '''
+        if boxes in self.assignments:
+            self.assignments.move_to_end(boxes)
+            return self.assignments[boxes]
+        parent = node.parent if node is not None else None
+        parent_boxes = None if parent is None else self.decode(parent.state)[1]
+        if parent_boxes is None or parent_boxes == boxes:
+            assignment = IncrementalAssignment.solve({box: self.distances[box] for box in boxes},
+                                                     len(self.target_list))
+        else:
+            if self.bitboard:
+                # the bitboard actions do not name the cells, compare the boxes instead
+                (box,) = set(parent_boxes) - set(boxes)
+                (new_box,) = set(boxes) - set(parent_boxes)
+            elif self.macro:
+                box, new_box = self.pushed_box(node.action)
+            else:
+                # the worker stepped on the cell of the box it pushed
+                box = node.state[0]
+                dx, dy = self.directions[node.action]
+                new_box = (box[0] + dx, box[1] + dy)
+            assignment = self.box_assignment(parent_boxes).replace(box, new_box, self.distances[new_box])
+            if self.check_incremental_h:
+                total, _ = min_cost_assignment([self.distances[box] for box in boxes])
+                if total != assignment.total:
+                    raise AssertionError(f'incremental h {assignment.total} != {total} for boxes {boxes}')
+        self.assignments[boxes] = assignment
+        if len(self.assignments) > self.assignment_cache_size:
+            self.assignments.popitem(last=False)
+        return assignment
+
+    def decode(self, state):
+        '''
+        return the state as (worker, boxes) with (x, y) cells, whatever the engine
+        '''
+        if self.bitboard:
+            return self.bitboard.decode(state)
+        return state
+
+    def pack_state(self, state):
+        '''
+        pack the state into self.packed_size bytes:
+        the worker cell index followed by the sorted box cell indices as uint16,
+        or for the bitboard engine the worker index and the boxes mask
+        '''
+        worker, boxes = state
+        if self.bitboard:
+            return worker.to_bytes(2, 'little') + boxes.to_bytes(self.mask_bytes, 'little')
+        width = self.width
+        return self.packer.pack(worker[1] * width + worker[0], *[y * width + x for x, y in boxes])
+
+    def explored_store(self, spill_after=None, directory=None):
+        '''
+        the explored set for a search on this puzzle: a plain set, or when
+        spill_after is given a DiskBackedSet keeping spill_after states in memory.
+        A disk-backed search should run with history_check=False, since the
+        history set would keep every state in memory anyway.
+        '''
+        if spill_after is None:
+            return set()
+        return DiskBackedSet(self.pack_state, self.packed_size, hot_capacity=spill_after, directory=directory)
+
+
+class SokobanPullPuzzle(search.Problem):
+    '''
+    The macro puzzle of a SokobanPuzzle played backwards, from the goal
+    configuration to the initial one, by pulling boxes.
+    It is the backward half of search.bidirectional_astar_search.
+    States are encoded like the macro states of the forward puzzle (the
+    top-left cell of the worker region and the sorted boxes tuple), so the
+    two searches meet on the same states.
+    self.initial is the list of goal states, one per worker region of the
+    goal configuration.
+    An action is named after the forward push it undoes: ((r, c), direction)
+    pulls the box next to cell (r, c) onto (r, c), and the forward puzzle
+    pushes it back with the same action.
+    '''
+
+    def __init__(self, puzzle):
+        '''
+        puzzle: a macro SokobanPuzzle with the tuple engine and as many boxes as targets
+        '''
+        self.puzzle = puzzle
+        self.directions = puzzle.directions
+        goal = tuple(puzzle.target_list)
+        self.initial = []
+        covered = set(goal)
+        for cell in sorted(puzzle.interior_cells, key=lambda cell: (cell[1], cell[0])):
+            if cell not in covered:
+                region = puzzle.get_reachable_range(cell, goal, key=goal)
+                covered |= region
+                self.initial.append((top_left(region), goal))
+        self.goal = puzzle.initial
+        # pulls back to the initial boxes, columns follow self.sources
+        self.sources = puzzle.initial[1]
+        self.distances = pull_distances(puzzle.interior_cells, self.sources)
+        # boxes and targets sealed off from the worker only fit the cell they stand on
+        for cell in (set(self.sources) | set(goal)) - puzzle.interior_cells:
+            self.distances[cell] = tuple(0 if source == cell else math.inf for source in self.sources)
+        # never pull a box where the forward puzzle would never push it
+        self.blocked_cells = puzzle.taboo_cells | puzzle.dead_cells | \
+            {cell for cell, row in self.distances.items() if min(row, default=0) == math.inf}
+
+    def actions(self, state):
+        worker, boxes = state
+        region = self.puzzle.get_reachable_range(worker, boxes, key=boxes)
+        interior = self.puzzle.interior_cells
+        possible_actions = []
+        for (box_x, box_y) in boxes:
+            for direction, (dx, dy) in self.directions.items():
+                # the worker pulls from the cell behind the box and steps back one more cell
+                cell = (box_x - dx, box_y - dy)
+                back = (box_x - 2 * dx, box_y - 2 * dy)
+                if cell in region and back in interior and back not in boxes and cell not in self.blocked_cells:
+                    possible_actions.append(((cell[1], cell[0]), direction))
+        return possible_actions
+
+    def result(self, state, action):
+        worker, boxes = state
+        (y, x), direction = action
+        dx, dy = self.directions[direction]
+        new_boxes = moved_box(boxes, (x + dx, y + dy), (x, y))
+        return self.puzzle.canonical_worker((x - dx, y - dy), new_boxes, key=new_boxes), new_boxes
+
+    def goal_test(self, state):
+        return state == self.goal
+
+    def h(self, node):
+        '''
+        the pulls of a minimum-cost assignment of boxes to distinct initial
+        boxes, like SokobanPuzzle.h with the pull distances
+        '''
+        cost = [self.distances[box] for box in node.state[1]]
+        assign = min_cost_assignment if len(cost) <= HUNGARIAN_LIMIT else greedy_assignment
+        return assign(cost)[0]
+
 
 def check_action_seq(warehouse, action_seq):
     '''
@@ -425,13 +1214,60 @@ def check_action_seq(warehouse, action_seq):
     return str(new_warehouse)
 
 
-def solve_sokoban_elem(warehouse):
+def is_solution(warehouse, action_seq, macro=False):
+    '''
+    Determine if 'action_seq' is a legal sequence of elementary actions
+    (or of macro actions when macro is True) that puts every box on a target.
+    '''
+    solver = SokobanPuzzle(warehouse, macro=macro, allow_taboo_push=True, history_check=False)
+    state = solver.initial
+    for action in action_seq:
+        if action not in solver.actions(state):
+            return False
+        state = solver.result(state, action)
+    return solver.goal_test(state)
+
+
+def run_search(solver, spill_after=None, anytime=False, time_limit=None, node_limit=None):
+    '''
+    search solver with A*, or with the anytime weighted A* when anytime is set,
+    and return the goal node or None (see solve_sokoban_elem for the options)
+    '''
+    if anytime:
+        return search.anytime_weighted_astar_search(solver, time_limit=time_limit, node_limit=node_limit)
+    return search.astar_graph_search(solver, explored=solver.explored_store(spill_after))
+
+
+def solve_sokoban_elem(warehouse, engine='tuple', spill_after=None, anytime=False, time_limit=None, node_limit=None,
+                       cache=None, push_level=False):
     '''    
     This function should solve using elementary actions 
     the puzzle defined in a file.
     
     @param warehouse: a valid Warehouse object
 
+    @param engine: the state engine of SokobanPuzzle, 'tuple' or 'bitboard'
+
+    @param spill_after: if given, keep at most this many explored states in
+           memory and spill the older ones to a file on disk
+
+    @param anytime: if True, run an anytime weighted A* that returns a first
+           solution fast and keeps improving it until it is optimal or the
+           budget below runs out
+
+    @param time_limit, node_limit: the budget of the anytime search, in
+           seconds and in expanded nodes (None means no limit). If no
+           solution is found within the budget, search.BudgetExhausted is
+           raised.
+
+    @param cache: if given, a solution_cache.SolutionCache consulted before
+           searching and updated with the solution found
+
+    @param push_level: if True, search pushes as solve_sokoban_macro does
+           and walk the worker to each push along a shortest path. This is
+           much faster, the solution has the fewest pushes but not always
+           the fewest moves.
+
     @return
         If puzzle cannot be solved return the string 'Impossible'
         If a solution was found, return a list of elementary actions that solves
@@ -440,13 +1276,26 @@ def solve_sokoban_elem(warehouse):
             If the puzzle is already in a goal state, simply return []
     '''
 
-    solver = SokobanPuzzle(warehouse)
-    solution = search.astar_graph_search(solver)
-
-    if solution is None:
-        return 'Impossible'
+    settings = {'macro': False, 'anytime': anytime, 'time_limit': time_limit, 'node_limit': node_limit,
+                'push_level': push_level}
+    if cache is not None:
+        actions = cache.get(warehouse, settings, macro=False)
+        if actions is not None:
+            return actions
+
+    if push_level:
+        actions = solve_sokoban_macro(warehouse, engine=engine, spill_after=spill_after, anytime=anytime,
+                                      time_limit=time_limit, node_limit=node_limit)
+        if actions != 'Impossible':
+            actions = stitch_pushes(warehouse, actions)
     else:
-        return solution.solution()
+        solver = SokobanPuzzle(warehouse, engine=engine, history_check=spill_after is None and not anytime)
+        solution = run_search(solver, spill_after, anytime, time_limit, node_limit)
+        actions = 'Impossible' if solution is None else solution.solution()
+
+    if cache is not None:
+        cache.put(warehouse, settings, actions)
+    return actions
 
 
 def can_go_there(warehouse, dst):
@@ -460,13 +1309,13 @@ def can_go_there(warehouse, dst):
       True if the worker can walk to cell dst=(row,column) without pushing any box
       False otherwise
     '''
-    solver = SokobanPuzzle(warehouse)
     y, x = dst
-    reachable = solver.get_reachable_range(warehouse.worker, set(warehouse.boxes))
+    reachable = reachable_cells(warehouse.worker, set(warehouse.walls), set(warehouse.boxes))
     return (x, y) in reachable
 
 
-def solve_sokoban_macro(warehouse):
+def solve_sokoban_macro(warehouse, engine='tuple', spill_after=None, bidirectional=False, anytime=False,
+                        time_limit=None, node_limit=None, tunnels=False, cache=None):
     '''    
     Solve using macro actions the puzzle defined in the warehouse passed as
     a parameter. A sequence of macro actions should be 
@@ -479,15 +1328,61 @@ def solve_sokoban_macro(warehouse):
     
     @param warehouse: a valid Warehouse object
 
+    @param engine: the state engine of SokobanPuzzle, 'tuple' or 'bitboard'
+
+    @param spill_after: if given, keep at most this many explored states in
+           memory and spill the older ones to a file on disk
+
+    @param bidirectional: if True, search forward with pushes and backward
+           with pulls from the goal at the same time (tuple engine only, and
+           only when there are as many boxes as targets)
+
+    @param anytime, time_limit, node_limit: anytime search and its budget,
+           see solve_sokoban_elem
+
+    @param tunnels: if True, push boxes through tunnels in one search step
+           (tuple engine only), the solution still lists every push
+
+    @param cache: a solution_cache.SolutionCache, see solve_sokoban_elem
+
     @return
         If puzzle cannot be solved return the string 'Impossible'
         Otherwise return M a sequence of macro actions that solves the puzzle.
         If the puzzle is already in a goal state, simply return []
     '''
-    solver = SokobanPuzzle(warehouse, macro=True)
-    solution = search.astar_graph_search(solver)
+    settings = {'macro': True, 'anytime': anytime, 'time_limit': time_limit, 'node_limit': node_limit,
+                'bidirectional': bidirectional, 'tunnels': tunnels}
+    if cache is not None:
+        actions = cache.get(warehouse, settings, macro=True)
+        if actions is not None:
+            return actions
+
+    if bidirectional and len(warehouse.boxes) == len(warehouse.targets):
+        actions = solve_sokoban_macro_bidirectional(warehouse)
+    else:
+        solver = SokobanPuzzle(warehouse, macro=True, engine=engine, history_check=spill_after is None and not anytime,
+                               tunnel_macros=tunnels)
+        solution = run_search(solver, spill_after, anytime, time_limit, node_limit)
+        actions = 'Impossible' if solution is None else solver.expand_actions(solution.solution())
 
-    if solution is None:
+    if cache is not None:
+        cache.put(warehouse, settings, actions)
+    return actions
+
+
+def solve_sokoban_macro_bidirectional(warehouse):
+    '''
+    solve_sokoban_macro with a bidirectional search: a forward A* of pushes
+    from the initial state and a backward A* of pulls from every goal state,
+    meeting in the middle. The pulls of the backward half are replayed in
+    reverse order as pushes, so the result has the same format.
+    '''
+    solver = SokobanPuzzle(warehouse, macro=True, history_check=False)
+    meeting = search.bidirectional_astar_search(solver, SokobanPullPuzzle(solver))
+    if meeting is None:
         return 'Impossible'
-    else:
-        return solution.solution()
+    node, reverse_node = meeting
+    actions = node.solution()
+    if reverse_node is not None:
+        actions += reverse_node.solution()[::-1]
+    return actions
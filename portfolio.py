@@ -0,0 +1,148 @@
+'''
+Race several solver configurations on one warehouse.
+
+Every configuration of CONFIGS runs in its own process and sends its
+answer back on its own pipe. The first solution that passes is_solution
+wins, the other processes are terminated and the time of every
+configuration is reported.
+
+Usage:
+    python ./portfolio.py --house ./warehouses/warehouse_0051.txt --timeout 60
+'''
+import argparse
+import json
+import multiprocessing
+import multiprocessing.connection
+import time
+
+import search
+from mySokobanSolver import SokobanPuzzle, is_solution, solve_sokoban_macro_bidirectional
+from sokoban import Warehouse
+
+# name -> options of SokobanPuzzle and the search to run
+CONFIGS = {
+    'macro-astar': dict(macro=True, algorithm='astar'),
+    'macro-bitboard-astar': dict(macro=True, algorithm='astar', engine='bitboard'),
+    'macro-bidirectional': dict(macro=True, algorithm='bidirectional'),
+    'macro-anytime': dict(macro=True, algorithm='anytime'),
+    'elem-astar': dict(macro=False, algorithm='astar'),
+    'elem-bfs': dict(macro=False, algorithm='bfs'),
+}
+
+# searches that only answer 'Impossible' after an exhaustive search
+COMPLETE = {'astar', 'bfs', 'bidirectional'}
+
+
+def solve_config(house, config):
+    '''
+    solve the warehouse file 'house' with one configuration of CONFIGS
+    return (actions or 'Impossible', duration)
+    '''
+    wh = Warehouse()
+    wh.load_warehouse(house)
+    start = time.time()
+    algorithm = config['algorithm']
+    if algorithm == 'bidirectional':
+        actions = solve_sokoban_macro_bidirectional(wh)
+    else:
+        solver = SokobanPuzzle(wh, macro=config['macro'], engine=config.get('engine', 'tuple'),
+                               history_check=algorithm != 'anytime')
+        if algorithm == 'astar':
+            solution = search.astar_graph_search(solver)
+        elif algorithm == 'anytime':
+            # the first solution is what matters in a race
+            solution = search.anytime_weighted_astar_search(solver, weights=(5,))
+        else:
+            solution = search.breadth_first_graph_search(solver)
+        actions = 'Impossible' if solution is None else solution.solution()
+    return actions, time.time() - start
+
+
+def portfolio_worker(conn, house, name):
+    '''
+    solve the warehouse with configuration 'name' and send back
+    ('done', actions, duration) or ('error', message, duration)
+    '''
+    start = time.time()
+    try:
+        actions, duration = solve_config(house, CONFIGS[name])
+        conn.send(('done', actions, duration))
+    except Exception as error:
+        conn.send(('error', repr(error), time.time() - start))
+    conn.close()
+
+
+def solve_portfolio(house, configs=None, timeout=None):
+    '''
+    race the configurations (names of CONFIGS, all of them by default)
+    on the warehouse file 'house'
+    return a dict with
+        config: the name of the winning configuration, or None
+        macro: whether the solution is made of macro actions
+        solution: the actions, 'Impossible', or None if nothing finished in time
+        duration: the wall time of the race
+        timings: name -> {'status': 'solved' | 'impossible' | 'rejected' | 'error' | 'stopped',
+                          'duration': seconds}
+    '''
+    names = list(configs or CONFIGS)
+    wh = Warehouse()
+    wh.load_warehouse(house)
+    result = {'config': None, 'macro': None, 'solution': None, 'duration': 0.0, 'timings': {}}
+    start = time.time()
+    running = {}  # conn -> (process, name)
+    try:
+        for name in names:
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=portfolio_worker, args=(child_conn, house, name), daemon=True)
+            process.start()
+            child_conn.close()
+            running[parent_conn] = (process, name)
+
+        while running and result['config'] is None:
+            wait = None if timeout is None else timeout - (time.time() - start)
+            if wait is not None and wait <= 0:
+                break
+            for conn in multiprocessing.connection.wait(list(running), timeout=wait):
+                process, name = running.pop(conn)
+                config = CONFIGS[name]
+                try:
+                    kind, value, duration = conn.recv()
+                except EOFError:
+                    # the process died, e.g. killed for running out of memory
+                    kind, value, duration = 'error', None, time.time() - start
+                process.join()
+                conn.close()
+                if value is None:
+                    value = f'exited with code {process.exitcode}'
+                if kind == 'error':
+                    result['timings'][name] = {'status': 'error', 'duration': duration, 'error': value}
+                    continue
+                if value == 'Impossible':
+                    status = 'impossible' if config['algorithm'] in COMPLETE else 'rejected'
+                else:
+                    status = 'solved' if is_solution(wh, value, config['macro']) else 'rejected'
+                result['timings'][name] = {'status': status, 'duration': duration}
+                if status in ('solved', 'impossible'):
+                    result.update(config=name, macro=config['macro'], solution=value)
+                    break
+    finally:
+        for conn, (process, _) in running.items():
+            process.terminate()
+            process.join()
+            conn.close()
+    result['duration'] = time.time() - start
+    for name in names:
+        result['timings'].setdefault(name, {'status': 'stopped', 'duration': result['duration']})
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--house', type=str)
+    parser.add_argument('--timeout', type=float, default=None)
+    parser.add_argument('--configs', type=str, nargs='*', choices=sorted(CONFIGS), default=None)
+    args = parser.parse_args()
+
+    result = solve_portfolio(args.house, args.configs, args.timeout)
+    result['solution'] = str(result['solution'])
+    print(json.dumps(result))
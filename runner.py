@@ -1,7 +1,13 @@
 import argparse
 import json
+import signal
+import sys
 
 from mySokobanSolver import *
+from portfolio import solve_portfolio
+from hdastar import solve_sokoban_parallel
+from deadlocks import DeadlockDB
+from solution_cache import SolutionCache
 from sokoban import *
 from search import *
 import time
@@ -16,29 +22,206 @@ def str2bool(v):
     else:
         raise argparse.ArgumentTypeError('Boolean value expected.')
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--macro', type=str2bool)
-parser.add_argument('--taboo', type=str2bool)
-parser.add_argument('--house', type=str)
-parser.add_argument('--algorithm', type=str)
 
-args = parser.parse_args()
+class JobTimeout(Exception):
+    pass
 
-house = Warehouse()
-house.load_warehouse(args.house)
-solver = SokobanPuzzle(house, macro=args.macro, allow_taboo_push=args.taboo)
 
-start = time.time()
-solution = None
-if args.algorithm == 'astar':
-    solution = astar_graph_search(solver)
-else:
-    solution = breadth_first_graph_search(solver)
-duration = time.time() - start
+def build_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--macro', type=str2bool)
+    parser.add_argument('--taboo', type=str2bool)
+    parser.add_argument('--house', type=str)
+    parser.add_argument('--algorithm', type=str, help='astar, idastar, anytime, hdastar or bfs (default)')
+    parser.add_argument('--engine', type=str, default='tuple', choices=['tuple', 'bitboard'])
+    parser.add_argument('--zobrist', type=str2bool, default=False)
+    parser.add_argument('--spill', type=int, default=None,
+                        help='keep at most this many explored states in memory, spill the rest to disk')
+    parser.add_argument('--spill-dir', type=str, default=None)
+    parser.add_argument('--deadlock-db', type=str, default=None,
+                        help='JSON file of learned deadlock patterns, loaded before and updated after the search')
+    parser.add_argument('--corrals', type=str2bool, default=False,
+                        help='macro only: restrict the pushes to a PI-corral when there is one')
+    parser.add_argument('--tunnels', type=str2bool, default=False,
+                        help='macro only: push boxes through tunnels in one search step')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='directory of cached solutions, checked before use (not with --portfolio)')
+    parser.add_argument('--cache-size', type=int, default=64, help='MB of cached solutions kept in --cache-dir')
+    parser.add_argument('--push-level', type=str2bool, default=False,
+                        help='elementary only: search pushes as in macro mode, then walk the worker to each push')
+    parser.add_argument('--bidirectional', type=str2bool, default=False,
+                        help='macro only: meet a forward push search with a backward pull search')
+    parser.add_argument('--workers', type=int, default=None, help='processes, for --algorithm hdastar')
+    parser.add_argument('--portfolio', type=str2bool, default=False,
+                        help='race the configurations of portfolio.py in a process pool, ignores the other options')
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='seconds, for --algorithm anytime or hdastar and --portfolio')
+    parser.add_argument('--node-limit', type=int, default=None, help='expanded nodes, for --algorithm anytime')
+    parser.add_argument('--worker', type=str2bool, default=False,
+                        help='read JSON-lines jobs on stdin and write one JSON result per line, see serve()')
+    parser.add_argument('--max-jobs', type=int, default=None, help='worker: exit after this many jobs')
+    parser.add_argument('--max-memory', type=int, default=None,
+                        help='worker: exit after a job once the peak memory exceeds this many MB')
+    return parser
 
-result = {
-    'duration': duration,
-    'solution': 'Impossible' if solution is None else str(solution.solution())
-}
 
-print(json.dumps(result))
\ No newline at end of file
+def solve(args):
+    '''
+    solve the warehouse args.house with the options of the command line
+    return the result dict printed by runner.py
+    '''
+    house = Warehouse()
+    house.load_warehouse(args.house)
+    cache = None
+    if args.cache_dir and not args.portfolio:
+        # the portfolio picks macro or elementary actions itself
+        cache = SolutionCache(args.cache_dir, args.cache_size * 2 ** 20)
+        settings = {key: getattr(args, key) for key in ('macro', 'taboo', 'algorithm', 'engine', 'corrals', 'tunnels',
+                                                        'bidirectional', 'push_level', 'time_limit', 'node_limit')}
+        start = time.time()
+        actions = cache.get(house, settings, bool(args.macro))
+        if actions is not None:
+            return {'duration': time.time() - start, 'solution': str(actions), 'cached': True}
+    # a push-level elementary search is a macro search whose pushes are stitched together afterwards
+    push_level = args.push_level and not args.macro
+    macro = bool(args.macro) or push_level
+    deadlocks = DeadlockDB(args.deadlock_db) if args.deadlock_db else None
+    solver = SokobanPuzzle(house, macro=macro, allow_taboo_push=args.taboo, engine=args.engine,
+                           zobrist=args.zobrist, deadlocks=deadlocks, corral_pruning=args.corrals and macro,
+                           tunnel_macros=args.tunnels and macro,
+                           # IDA* and the anytime search revisit states, the spilled search keeps them on disk
+                           history_check=args.spill is None and args.algorithm not in ('idastar', 'anytime'))
+    explored = solver.explored_store(args.spill, args.spill_dir)
+
+    start = time.time()
+    race = None
+    if args.portfolio:
+        race = solve_portfolio(args.house, timeout=args.time_limit)
+        actions = race['solution']
+    elif args.algorithm == 'hdastar':
+        try:
+            actions = solve_sokoban_parallel(house, macro, args.workers, args.time_limit)
+        except BudgetExhausted:
+            return {'duration': time.time() - start, 'error': 'timeout'}
+    elif args.bidirectional and macro and len(house.boxes) == len(house.targets):
+        actions = solve_sokoban_macro_bidirectional(house)
+    else:
+        if args.algorithm == 'astar':
+            solution = astar_graph_search(solver, explored=explored)
+        elif args.algorithm == 'idastar':
+            solution = idastar_search(solver)
+        elif args.algorithm == 'anytime':
+            try:
+                solution = anytime_weighted_astar_search(solver, time_limit=args.time_limit,
+                                                         node_limit=args.node_limit)
+            except BudgetExhausted:
+                # not 'Impossible': the puzzle may have a solution beyond the budget
+                if deadlocks is not None:
+                    deadlocks.save()
+                return {'duration': time.time() - start, 'error': 'timeout'}
+        else:
+            solution = breadth_first_graph_search(solver, explored=explored)
+        actions = 'Impossible' if solution is None else solver.expand_actions(solution.solution())
+    if push_level and actions != 'Impossible':
+        actions = stitch_pushes(house, actions)
+    duration = time.time() - start
+    if deadlocks is not None:
+        deadlocks.save()
+    if cache is not None:
+        cache.put(house, settings, actions)
+
+    result = {
+        'duration': duration,
+        'solution': str(actions)
+    }
+    if race is not None:
+        result.update(config=race['config'], macro=race['macro'], timings=race['timings'])
+    return result
+
+
+def job_args(parser, job):
+    '''
+    the options of a job: the defaults of the command line updated with
+    the keys of the job, named like the options ('time-limit' or 'time_limit')
+    '''
+    args = parser.parse_args([])
+    for key, value in job.items():
+        key = key.replace('-', '_')
+        if key in ('id', 'timeout'):
+            continue
+        if not hasattr(args, key) or key in ('worker', 'max_jobs', 'max_memory'):
+            raise ValueError(f'unknown job option {key!r}')
+        if isinstance(value, str) and key in ('macro', 'taboo', 'zobrist', 'corrals', 'tunnels', 'push_level',
+                                              'bidirectional', 'portfolio'):
+            value = str2bool(value)
+        setattr(args, key, value)
+    return args
+
+
+def on_alarm(signum, frame):
+    raise JobTimeout()
+
+
+def serve(parser, max_jobs=None, max_memory=None, jobs=sys.stdin, out=sys.stdout):
+    '''
+    long-lived worker: solve the JSON-lines jobs read from 'jobs', e.g.
+        {"id": 7, "house": "./warehouses/warehouse_0051.txt", "macro": true, "taboo": false,
+         "algorithm": "astar", "timeout": 60}
+    and write one JSON line per job to 'out', the result of solve() with
+    the id and house of the job, or {"id", "house", "error"} where error is
+    'timeout' or the message of the exception.
+    timeout (seconds) stops the solve of one job, the worker goes on.
+    The worker exits after max_jobs jobs, or after the job that brings its
+    peak memory above max_memory MB, the caller starts a new one to get the
+    memory back.
+    Unix only: the timeouts use SIGALRM and the peak memory comes from the
+    resource module.
+    '''
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is None or not hasattr(signal, 'SIGALRM'):
+        raise RuntimeError(f'runner.py --worker needs SIGALRM and the resource module, not available on {sys.platform}')
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    rss_per_mb = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+    signal.signal(signal.SIGALRM, on_alarm)
+    done = 0
+    for line in jobs:
+        if not line.strip():
+            continue
+        job = {}
+        try:
+            job = json.loads(line)
+            args = job_args(parser, job)
+            if job.get('timeout'):
+                signal.setitimer(signal.ITIMER_REAL, job['timeout'])
+            try:
+                result = solve(args)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except JobTimeout:
+            result = {'error': 'timeout'}
+        except Exception as e:
+            result = {'error': f'{type(e).__name__}: {e}'}
+        result = dict(id=job.get('id'), house=job.get('house'), **result)
+        out.write(json.dumps(result) + '\n')
+        out.flush()
+        done += 1
+        if done == max_jobs or (max_memory and
+                                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss > max_memory * rss_per_mb):
+            return done
+    return done
+
+
+if __name__ == '__main__':
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.worker:
+        try:
+            serve(parser, args.max_jobs, args.max_memory)
+        except RuntimeError as e:
+            parser.error(str(e))
+    else:
+        print(json.dumps(solve(args)))
@@ -28,6 +28,8 @@ import sys
 assert sys.version_info >= (3, 5)
 
 import itertools
+import time
+import collections
 
 
 # momoization decorator
@@ -41,6 +43,46 @@ def memoize(fn):
     return memoized_fn
 
 
+class BoundedMemo:
+    """
+    Memoize a function of a search node, such as a heuristic h(node).
+    Values are keyed by node.state, so the cache does not keep the nodes
+    (and their parent chains) alive, and at most 'capacity' values are kept,
+    evicting the least recently used one.
+    The counters hits and misses give the hit rate of the cache.
+    """
+    def __init__(self, fn, capacity=1000000):
+        self.fn = fn
+        self.capacity = capacity
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, node):
+        key = node.state
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        value = self.cache[key] = self.fn(node)
+        if len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
+        return value
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'size': len(self.cache),
+        }
+
+
 def update(x, **entries):
     """Update a dict; or an object with slots; according to entries.
     >>> update({'a': 1}, a=10, b=20)
@@ -55,7 +97,8 @@ def update(x, **entries):
     return x
 
 #______________________________________________________________________________
-# Queues: LIFOQueue (also known as Stack), FIFOQueue, PriorityQueue
+# Queues: LIFOQueue (also known as Stack), FIFOQueue, PriorityQueue,
+#         IndexedPriorityQueue
 
 class Queue:
     """
@@ -85,7 +128,6 @@ def LIFOQueue():
     return []
 
 
-import collections # for dequeue
 class FIFOQueue(collections.deque):
     """
     A First-In-First-Out Queue.
@@ -150,6 +192,84 @@ class PriorityQueue(Queue):
                 heapq.heapify(self.heap)
                 return
 
+
+class IndexedPriorityQueue(Queue):
+    """
+    A PriorityQueue that also keeps a map item -> heap entry.
+    Membership and lookup are O(1), and replacing an item with a better one
+    (decrease-key) is O(log n): the old entry is invalidated in place and
+    skipped when it reaches the top of the heap (lazy deletion).
+    Items are matched by equality, so two Nodes with the same state are
+    considered the same item.
+    """
+    REMOVED = object()  # placeholder for an invalidated entry
+
+    def __init__(self, f=lambda x: x):
+        self.heap = []  # list of entries [f(item), counter_value, item]
+        self.entries = {}  # item -> entry currently stored in the heap
+        self.f = f
+        self.counter = itertools.count()
+
+    def append(self, item):
+        """Insert item, replacing the entry of an equal item if present."""
+        self.append_with_priority(item, self.f(item))
+
+    def append_with_priority(self, item, priority):
+        """Insert item with an already computed f value."""
+        if item in self.entries:
+            self.remove(item)
+        entry = [priority, next(self.counter), item]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
+
+    def extend(self, items):
+        """Insert each item in items at its correct position."""
+        for item in items:
+            self.append(item)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return str([entry for entry in self.heap if entry[-1] is not self.REMOVED])
+
+    def pop(self):
+        """Pop and return the item with min f(x) value """
+        while self.heap:
+            item = heapq.heappop(self.heap)[-1]
+            if item is not self.REMOVED:
+                del self.entries[item]
+                return item
+        raise Exception('Trying to pop from empty PriorityQueue.')
+
+    def priority(self, key):
+        """Return the f value stored for the item equal to key."""
+        return self.entries[key][0]
+
+    def min_priority(self):
+        """Return the smallest f value in the queue, infinity if it is empty."""
+        while self.heap and self.heap[0][-1] is self.REMOVED:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else float('inf')
+
+    def remove(self, key):
+        """Invalidate the entry of the item equal to key."""
+        entry = self.entries.pop(key)
+        entry[-1] = self.REMOVED
+
+    def __contains__(self, item):
+        """Return True if item in PriorityQueue."""
+        return item in self.entries
+
+    def __getitem__(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry[-1]
+
+    def __delitem__(self, key):
+        if key in self.entries:
+            self.remove(key)
+
 #______________________________________________________________________________
 
 class Problem(object):
@@ -207,14 +327,17 @@ class Node:
     may add an f and h value; see best_first_graph_search and astar_search for
     an explanation of how the f and h values are handled. You will not need to
     subclass this class.
+    The fields are slots, so a node has no per-instance __dict__.
     """
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth')
 
     def __init__(self, state, parent=None, action=None, path_cost=0):
         "Create a search tree Node, derived from a parent by an action."
-        update(self, state=state, parent=parent, action=action,
-               path_cost=path_cost, depth=0)
-        if parent:
-            self.depth = parent.depth + 1
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.path_cost = path_cost
+        self.depth = parent.depth + 1 if parent else 0
 
     def __repr__(self):
         return "<Node %s>" % (self.state,)
@@ -255,6 +378,7 @@ class Node:
     def __hash__(self):
         return hash(self.state)
 
+
 #______________________________________________________________________________
 
 # Uninformed Search algorithms
@@ -277,18 +401,21 @@ def tree_search(problem, frontier):
         frontier.extend(node.expand(problem))
     return None
 
-def graph_search(problem, frontier):
+def graph_search(problem, frontier, explored=None):
     """
     Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     If two paths reach a state, only use the first one. [Fig. 3.7]
+    explored is an empty set-like store with add() and 'in', e.g. a
+    transposition.DiskBackedSet, a new set() by default.
     Return
         the node of the first goal state found
         or None is no goal state is found
     """
     assert isinstance(problem, Problem)
     frontier.append(Node(problem.initial))
-    explored = set() # initial empty set of explored states
+    if explored is None:
+        explored = set() # initial empty set of explored states
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
@@ -311,14 +438,14 @@ def depth_first_tree_search(problem):
     return tree_search(problem, LIFOQueue())
 
 
-def depth_first_graph_search(problem):
+def depth_first_graph_search(problem, explored=None):
     "Search the deepest nodes in the search tree first."
-    return graph_search(problem, LIFOQueue())
+    return graph_search(problem, LIFOQueue(), explored)
 
 
-def breadth_first_graph_search(problem):
+def breadth_first_graph_search(problem, explored=None):
     "Graph search version of BFS.  [Fig. 3.11]"
-    return graph_search(problem, FIFOQueue())
+    return graph_search(problem, FIFOQueue(), explored)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
@@ -350,28 +477,44 @@ def best_first_tree_search(problem, f):
 
 
 
-def best_first_graph_search(problem, f):
+def best_first_graph_search(problem, f, queue=IndexedPriorityQueue, explored=None):
     """
     Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have breadth-first search.
+    The frontier is an IndexedPriorityQueue by default, which gives O(1)
+    membership tests and O(log n) replacement of a worse incumbent.
+    With it, a node whose f value is infinite is a dead end and is never
+    added to the frontier.
+    Pass queue=PriorityQueue to use the original linear-scan queue.
+    explored is an empty set-like store with add() and 'in', e.g. a
+    transposition.DiskBackedSet, a new set() by default.
     """
     node = Node(problem.initial)
     if problem.goal_test(node.state):
         return node
-    frontier = PriorityQueue(f)
+    frontier = queue(f)
     frontier.append(node)
-    explored = set()
+    if explored is None:
+        explored = set()
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
         explored.add(node.state)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+            if child.state in explored:
+                continue
+            if isinstance(frontier, IndexedPriorityQueue):
+                f_child = f(child)
+                if f_child == float('inf'):
+                    continue
+                if child not in frontier or f_child < frontier.priority(child):
+                    frontier.append_with_priority(child, f_child)
+            elif child not in frontier:
                 frontier.append(child)
-            elif child in frontier:
+            else:
                 incumbent = frontier[child] # incumbent is a node
                 if f(child) < f(incumbent):
                     del frontier[incumbent]
@@ -418,12 +561,183 @@ def iterative_deepening_search(problem):
 greedy_best_first_graph_search = best_first_graph_search
     # Greedy best-first search is accomplished by specifying f(n) = h(n).
 
-def astar_graph_search(problem, h=None):
+def astar_graph_search(problem, h=None, memo_capacity=1000000, explored=None):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search, or
-    else in your Problem subclass."""
-    h = memoize(h or problem.h)
-    return best_first_graph_search(problem, lambda n: n.path_cost + h(n))
+    else in your Problem subclass.
+    h must only depend on node.state: its values are memoized by state
+    in a BoundedMemo of memo_capacity entries."""
+    h = BoundedMemo(h or problem.h, memo_capacity)
+    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), explored=explored)
+
+
+class BudgetExhausted(Exception):
+    """Raised by anytime_weighted_astar_search when its time or node budget
+    runs out before any solution is found. The problem may still be
+    solvable, unlike when the search returns None."""
+
+
+def anytime_weighted_astar_search(problem, h=None, weights=(5, 3, 2, 1.5, 1.2, 1), time_limit=None,
+                                  node_limit=None, memo_capacity=1000000):
+    """Anytime weighted A*, in the style of ARA*.
+    The first iteration orders the frontier by g + w * h with the first
+    (large) weight, which finds a solution fast. Each next iteration lowers
+    the weight and keeps searching for a cheaper solution. Any node with
+    g + h no smaller than the cost of the best solution found so far (the
+    incumbent) is pruned.
+    Work is reused between iterations: the best node of every reached state
+    is kept, and the frontier carries over, reordered with the new weight.
+    Nodes improved after they were expanded are put back in the frontier.
+    The search stops when the iteration with the last weight ends, or when
+    time_limit seconds or node_limit expansions are used up.
+    Return the best goal node found, or None when the whole search space
+    was searched without finding one. Raise BudgetExhausted when the budget
+    runs out before a solution is found. With a weight of 1 at the end and
+    an admissible h, a search that completes returns an optimal solution.
+    The problem must return the actions of a state every time it is asked."""
+    h = BoundedMemo(h or problem.h, memo_capacity)
+    deadline = None if time_limit is None else time.time() + time_limit
+    root = Node(problem.initial)
+    reached = {root.state: root}  # best node reached for every state
+    open_nodes = [root]
+    incumbent = None
+    expanded = 0
+    for weight in weights:
+        frontier = IndexedPriorityQueue(lambda n, weight=weight: n.path_cost + weight * h(n))
+        for node in open_nodes:
+            if h(node) < float('inf'):
+                frontier.append(node)
+        explored = set()
+        reopened = []  # nodes improved after their expansion in this iteration
+        while frontier:
+            if incumbent is not None and frontier.min_priority() >= incumbent.path_cost:
+                break
+            if (deadline is not None and time.time() > deadline) or \
+                    (node_limit is not None and expanded >= node_limit):
+                if incumbent is None:
+                    raise BudgetExhausted(f'no solution within the budget, {expanded} nodes expanded')
+                return incumbent
+            node = frontier.pop()
+            if incumbent is not None and node.path_cost + h(node) >= incumbent.path_cost:
+                continue
+            if problem.goal_test(node.state):
+                incumbent = node
+                continue
+            explored.add(node.state)
+            expanded += 1
+            for child in node.expand(problem):
+                known = reached.get(child.state)
+                if known is not None and known.path_cost <= child.path_cost:
+                    continue
+                reached[child.state] = child
+                if child.state in explored:
+                    reopened.append(child)
+                elif h(child) < float('inf'):
+                    frontier.append(child)
+        open_nodes = list(frontier.entries) + [node for node in reopened if reached[node.state] is node]
+    return incumbent
+
+
+def idastar_search(problem, h=None, table_capacity=1000000, memo_capacity=1000000):
+    """Iterative deepening A* (IDA*), for problems where A* runs out of memory.
+    Each iteration is a depth-first search that cuts every node whose
+    f = g + h exceeds the bound, and the next bound is the smallest f that
+    was cut. The depth-first search runs on an explicit stack of child
+    iterators, so long solutions do not hit the recursion limit, and the
+    children are tried by increasing f (move ordering).
+    A transposition table of at most table_capacity states (least recently
+    used evicted first) keeps the smallest g at which each state was reached
+    in the current iteration, and a state reached again with no smaller g is
+    cut. h is memoized by state in a BoundedMemo of memo_capacity entries.
+    The problem must return the actions of a state every time it is asked."""
+    h = BoundedMemo(h or problem.h, memo_capacity)
+    root = Node(problem.initial)
+    bound = h(root)
+    table = collections.OrderedDict()
+    while bound < float('inf'):
+        next_bound = float('inf')
+        table.clear()
+        stack = [iter([root])]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                continue
+            f = node.path_cost + h(node)
+            if f > bound:
+                next_bound = min(next_bound, f)
+                continue
+            if problem.goal_test(node.state):
+                return node
+            g = table.get(node.state)
+            if g is not None:
+                table.move_to_end(node.state)
+                if g <= node.path_cost:
+                    continue
+            table[node.state] = node.path_cost
+            if len(table) > table_capacity:
+                table.popitem(last=False)
+            children = node.expand(problem)
+            children.sort(key=lambda child: child.path_cost + h(child))
+            stack.append(iter(children))
+        bound = next_bound
+    return None
+
+
+def bidirectional_astar_search(problem, reverse_problem, h=None, reverse_h=None, memo_capacity=1000000):
+    """Bidirectional A*: a forward A* from problem.initial and a backward A*
+    on reverse_problem, whose actions undo the actions of problem and whose
+    initial attribute is a list of start states (e.g. every goal state).
+    Both problems must encode states the same way. Each search keeps a table
+    state -> best node reached, and the searches meet when one of them
+    generates a state already in the table of the other.
+    The search with the smaller frontier is expanded next. It stops when the
+    cheapest meeting found costs no more than the smallest f value of either
+    frontier, which makes the result optimal when both heuristics are admissible.
+    Return None if there is no solution, otherwise (node, reverse_node): the
+    forward and backward nodes of the meeting state. reverse_node is None when
+    the forward search popped a goal state by itself."""
+    h = BoundedMemo(h or problem.h, memo_capacity)
+    reverse_h = BoundedMemo(reverse_h or reverse_problem.h, memo_capacity)
+    sides = []
+    for p, side_h, starts in ((problem, h, [problem.initial]), (reverse_problem, reverse_h, reverse_problem.initial)):
+        frontier = IndexedPriorityQueue(lambda n, side_h=side_h: n.path_cost + side_h(n))
+        reached = {}
+        for state in starts:
+            node = Node(state)
+            frontier.append(node)
+            reached[state] = node
+        sides.append((p, frontier, reached, set()))
+
+    best_cost, best = float('inf'), None
+    for state, node in sides[0][2].items():
+        if state in sides[1][2]:
+            best_cost, best = 0, (node, sides[1][2][state])
+    while sides[0][1] and sides[1][1]:
+        if best_cost <= max(sides[0][1].min_priority(), sides[1][1].min_priority()):
+            break
+        forward = len(sides[0][1]) <= len(sides[1][1])
+        (p, frontier, reached, explored), other = (sides[0], sides[1][2]) if forward else (sides[1], sides[0][2])
+        node = frontier.pop()
+        if forward and node.path_cost < best_cost and p.goal_test(node.state):
+            best_cost, best = node.path_cost, (node, None)
+        explored.add(node.state)
+        for child in node.expand(p):
+            if child.state in explored:
+                continue
+            f_child = frontier.f(child)
+            if f_child == float('inf'):
+                continue
+            known = reached.get(child.state)
+            if known is not None and known.path_cost <= child.path_cost:
+                continue
+            reached[child.state] = child
+            frontier.append_with_priority(child, f_child)
+            meeting = other.get(child.state)
+            if meeting is not None and child.path_cost + meeting.path_cost < best_cost:
+                best_cost = child.path_cost + meeting.path_cost
+                best = (child, meeting) if forward else (meeting, child)
+    return best
 
 
 def astar_tree_search(problem, h=None):
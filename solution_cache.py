@@ -0,0 +1,130 @@
+'''
+On-disk cache of Sokoban solutions.
+
+A solution is stored in one JSON file named after the SHA-256 of the
+warehouse content (walls, targets, boxes and worker, sorted) and of the
+solver settings, so the same puzzle solved the same way is found again
+whatever its file name. A cached solution is replayed on the warehouse
+(check_action_seq, or is_solution for macro actions) before it is used,
+and a stale or corrupt entry is dropped.
+Only solutions are cached: an 'Impossible' answer cannot be checked.
+
+The files are used as an LRU store: a hit refreshes the modification time
+of its file, and once the files take more than max_bytes the oldest are
+removed. Several processes can share a directory: an entry another
+process removed in the meantime is a miss.
+
+    cache = SolutionCache('./.solutions')
+    actions = solve_sokoban_macro(warehouse, cache=cache)
+'''
+import hashlib
+import json
+import os
+import tempfile
+
+from mySokobanSolver import check_action_seq, is_solution
+
+
+def warehouse_key(warehouse, settings):
+    '''
+    the hex SHA-256 of the warehouse content and of the settings dict
+    '''
+    content = {
+        'walls': sorted(warehouse.walls),
+        'targets': sorted(warehouse.targets),
+        'boxes': sorted(warehouse.boxes),
+        'worker': warehouse.worker,
+        'settings': settings,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def verify(warehouse, actions, macro):
+    '''
+    True if actions is a legal sequence that solves the warehouse
+    '''
+    if macro:
+        return is_solution(warehouse, actions, macro=True)
+    result = check_action_seq(warehouse, actions)
+    # a box off target is drawn as '$'
+    return result != 'Failure' and '$' not in result
+
+
+class SolutionCache:
+    '''
+    A directory of solution files, at most max_bytes in total
+    hits, misses: the lookups that returned a checked solution or not
+    '''
+
+    def __init__(self, directory, max_bytes=64 * 2 ** 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, warehouse, settings, macro):
+        '''
+        return the checked cached solution of the warehouse for these
+        settings, or None
+        '''
+        path = self.path(warehouse_key(warehouse, settings))
+        try:
+            with open(path) as f:
+                actions = json.load(f)['solution']
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        if macro:
+            # JSON turned the ((r, c), direction) tuples into lists
+            actions = [(tuple(cell), direction) for cell, direction in actions]
+        valid = verify(warehouse, actions, macro)
+        try:
+            if valid:
+                os.utime(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            # evicted by another process in the meantime
+            valid = False
+        if not valid:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return actions
+
+    def put(self, warehouse, settings, actions):
+        '''
+        store a solution, 'Impossible' is ignored
+        '''
+        if actions == 'Impossible':
+            return
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'solution': actions}, f)
+        os.replace(temporary, self.path(warehouse_key(warehouse, settings)))
+        self.evict()
+
+    def evict(self):
+        '''
+        remove the least recently used files until the others fit in max_bytes
+        '''
+        sizes = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    sizes[entry.path] = entry.stat()
+                except FileNotFoundError:
+                    pass  # removed by another process
+        total = sum(stat.st_size for stat in sizes.values())
+        for path in sorted(sizes, key=lambda path: sizes[path].st_mtime):
+            if total <= self.max_bytes:
+                break
+            total -= sizes[path].st_size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,194 @@
+'''
+NumPy version of the static analysis of mySokobanSolver.scan_warehouse.
+
+The walls, targets and worker of a warehouse become 2-D boolean arrays.
+The interior is flooded by shifting the reached cells one step in each
+direction until nothing changes. Corners (rule 1) are a boolean
+expression of the shifted wall array. The runs of cells between two
+corners along a wall (rule 2) are numbered with a cumulative sum along
+the rows, then along the columns, and are tested all at once with
+bincount. The result is the same as scan_warehouse, cell for cell, so
+taboo_cells returns the same string.
+
+scan_warehouses stacks a list of warehouses into 3-D arrays, padded to
+the largest one, and analyses them together, so that the cost of a whole
+folder is a few array operations:
+
+    python ./static_analysis.py --folder ./warehouses
+
+Requires numpy, which the rest of the solver does not use.
+'''
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from sokoban import Warehouse
+
+
+def shifted(a, dy, dx):
+    '''
+    the array b of the shape of a with b[..., y, x] = a[..., y + dy, x + dx],
+    False where y + dy or x + dx falls outside the grid
+    '''
+    b = np.zeros_like(a)
+    height, width = a.shape[-2:]
+    b[..., max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)] = \
+        a[..., max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+    return b
+
+
+def stack_warehouses(warehouses):
+    '''
+    return the (n, height, width) boolean arrays walls, targets, worker,
+    grid and inner of the warehouses, padded to the largest one
+    grid: the cells of the (x_size, y_size) grid of scan_warehouse
+    inner: the cells of the grid visited by the rule 2 loops, off its border
+    and the list of the (x_size, y_size) of every warehouse
+    '''
+    sizes = []
+    for warehouse in warehouses:
+        X, Y = zip(*warehouse.walls)
+        sizes.append((1 + max(X), 1 + max(Y)))
+    shape = (len(sizes), max((y for _, y in sizes), default=0), max((x for x, _ in sizes), default=0))
+    walls, targets, worker, grid, inner = (np.zeros(shape, dtype=bool) for _ in range(5))
+    for i, (warehouse, (x_size, y_size)) in enumerate(zip(warehouses, sizes)):
+        X, Y = zip(*warehouse.walls)
+        walls[i, Y, X] = True
+        for x, y in warehouse.targets:
+            if x < x_size and y < y_size:
+                targets[i, y, x] = True
+        x, y = warehouse.worker
+        worker[i, y, x] = True
+        grid[i, :y_size, :x_size] = True
+        inner[i, 1:y_size - 1, 1:x_size - 1] = True
+    return walls, targets, worker, grid, inner, sizes
+
+
+def flood(free, seeds):
+    '''
+    the cells of 'free' connected to the seeds, on every layer of the stack
+    '''
+    reached = seeds & free
+    while True:
+        grown = reached | shifted(reached, 1, 0) | shifted(reached, -1, 0) \
+            | shifted(reached, 0, 1) | shifted(reached, 0, -1)
+        grown &= free
+        if np.array_equal(grown, reached):
+            return reached
+        reached = grown
+
+
+def wall_runs(walls, marks, targets, inner, side_a, side_b):
+    '''
+    rule 2 along the last axis: the cells lying between two taboo cells
+    'marks' of a row, with no wall in between, a wall on side_a or on
+    side_b of all of them and no target, as in the loops of scan_warehouse
+    A run starts after a wall, a mark or the start of the row and only
+    counts when it ends on a mark.
+    '''
+    rows = walls.reshape(-1, walls.shape[-1])
+    marks = (marks & inner & ~walls).reshape(rows.shape)
+    cells = (inner & ~walls).reshape(rows.shape) & ~marks
+    separators = ~cells
+    # cells of a row share a run number when no separator lies between them
+    run = np.cumsum(separators, axis=-1)
+    stride = rows.shape[-1] + 2
+    labels = np.arange(rows.shape[0])[:, None] * stride + run
+    size = rows.shape[0] * stride
+    # a run numbered k ends on the separator numbered k + 1
+    ends_on_mark = np.zeros(size, dtype=bool)
+    ends_on_mark[labels[marks]] = True
+    ends_on_mark = np.roll(ends_on_mark, -1)
+
+    def count(condition):
+        return np.bincount(labels[cells & condition.reshape(rows.shape)], minlength=size)
+
+    open_a = count(~side_a)
+    open_b = count(~side_b)
+    on_target = count(targets)
+    taboo_runs = ends_on_mark & ((open_a == 0) | (open_b == 0)) & (on_target == 0)
+    return (cells & taboo_runs[labels]).reshape(walls.shape)
+
+
+def scan_arrays(walls, targets, worker, grid, inner):
+    '''
+    the interior and taboo (n, height, width) boolean arrays of a stack of
+    warehouses, see stack_warehouses
+    '''
+    interior = flood(grid & ~walls, worker)
+
+    # Rule 1: interior cells that are not targets with a wall on two adjacent sides
+    left, right, up, down = shifted(walls, 0, -1), shifted(walls, 0, 1), shifted(walls, -1, 0), shifted(walls, 1, 0)
+    taboo = interior & ~targets & ((left & up) | (left & down) | (right & up) | (right & down))
+
+    # Rule 2: rows first, the taboo cells they add also end the runs of the columns
+    taboo |= wall_runs(walls, taboo, targets, inner, up, down)
+    columns = [a.swapaxes(-1, -2) for a in (walls, taboo, targets, inner, left, right)]
+    taboo |= wall_runs(*columns).swapaxes(-1, -2)
+    return interior, taboo
+
+
+def scan_warehouses(warehouses):
+    '''
+    scan_warehouse for a list of warehouses, analysed together
+    return a list of (interior cell set, taboo cell set, grid), as scan_warehouse
+    '''
+    walls, targets, worker, grid, inner, sizes = stack_warehouses(warehouses)
+    interior, taboo = scan_arrays(walls, targets, worker, grid, inner)
+
+    def cells(layer):
+        y, x = np.nonzero(layer)
+        return set(zip(x.tolist(), y.tolist()))
+
+    results = []
+    for i, (x_size, y_size) in enumerate(sizes):
+        codes = np.full((y_size, x_size), ' ')
+        codes[walls[i, :y_size, :x_size]] = '#'
+        codes[taboo[i, :y_size, :x_size]] = 'X'
+        results.append((cells(interior[i]), cells(taboo[i]), codes.tolist()))
+    return results
+
+
+def scan_warehouse(warehouse):
+    '''
+    mySokobanSolver.scan_warehouse computed with arrays
+    '''
+    return scan_warehouses([warehouse])[0]
+
+
+def taboo_cells(warehouse):
+    '''
+    mySokobanSolver.taboo_cells computed with arrays
+    '''
+    _, _, grid = scan_warehouse(warehouse)
+    return "\n".join(["".join(line) for line in grid])
+
+
+if __name__ == '__main__':
+    import mySokobanSolver
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--folder', type=str, default='./warehouses')
+    args = parser.parse_args()
+
+    warehouses = []
+    for problem_file in sorted(glob.glob(os.path.join(args.folder, '*.txt'))):
+        wh = Warehouse()
+        try:
+            wh.load_warehouse(problem_file)
+        except (AssertionError, ValueError):
+            continue
+        warehouses.append(wh)
+
+    start = time.time()
+    expected = [mySokobanSolver.scan_warehouse(wh) for wh in warehouses]
+    python_time = time.time() - start
+    start = time.time()
+    results = scan_warehouses(warehouses)
+    numpy_time = time.time() - start
+    different = sum(a != b for a, b in zip(expected, results))
+    print(f'{len(warehouses)} warehouses, scan_warehouse {python_time:.3f}s, '
+          f'scan_warehouses {numpy_time:.3f}s, {different} different')
@@ -1,7 +1,14 @@
 import glob
+import math
+import random
+import tempfile
 import time
 from sokoban import Warehouse
 from mySokobanSolver import *
+from assignment import IncrementalAssignment, min_cost_assignment
+from search import (BudgetExhausted, IndexedPriorityQueue, astar_graph_search, breadth_first_graph_search,
+                    idastar_search)
+from solution_cache import SolutionCache
 
 def test_warehouse(problem_file, macro = False):
     '''
@@ -129,4 +136,273 @@ def test_solve_sokoban_macro():
     else:
         print(fcn.__name__, ' failed!  :-(\n')
         print('Expected ');print(expected_answer)
-        print('But, received ');print(answer)
\ No newline at end of file
+        print('But, received ');print(answer)
+
+def test_indexed_priority_queue():
+    queue = IndexedPriorityQueue()
+    queue.append_with_priority('a', 5)
+    queue.append_with_priority('b', 3)
+    queue.append_with_priority('c', 4)
+    queue.append_with_priority('d', 6)
+    # decrease-key of 'a', lazy removal of 'c'
+    queue.append_with_priority('a', 1)
+    queue.remove('c')
+    answer = (len(queue), 'c' in queue, queue.priority('a'), queue.min_priority(),
+              [queue.pop() for _ in range(len(queue))])
+    expected_answer = (3, False, 1, 1, ['a', 'b', 'd'])
+    fcn = test_indexed_priority_queue
+    print('<<  Testing {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_incremental_assignment():
+    # replace one row after the other and compare with an assignment solved from scratch
+    rng = random.Random(680)
+    rows = {i: tuple(rng.choice([rng.randint(0, 9), math.inf]) for _ in range(6)) for i in range(5)}
+    assignment = IncrementalAssignment.solve(rows, 6)
+    answer, expected_answer = [], []
+    for step in range(20):
+        key = rng.choice(list(rows))
+        new_key = 5 + step
+        rows[new_key] = tuple(rng.choice([rng.randint(0, 9), math.inf]) for _ in range(6))
+        del rows[key]
+        assignment = assignment.replace(key, new_key, rows[new_key])
+        answer.append(assignment.total)
+        expected_answer.append(min_cost_assignment(list(rows.values()))[0])
+    fcn = test_incremental_assignment
+    print('<<  Testing {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_static_analysis_taboo_cells():
+    fcn = test_static_analysis_taboo_cells
+    print('<<  Testing {} >>'.format(fcn.__name__))
+    try:
+        import static_analysis
+    except ImportError:
+        print(fcn.__name__, ' skipped, numpy is not installed\n')
+        return
+    wh = Warehouse()
+    wh.load_warehouse("./warehouses/warehouse_0001.txt")
+    expected_answer = taboo_cells(wh)
+    answer = static_analysis.taboo_cells(wh)
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_solve_sokoban_macro_bidirectional():
+    # the target is sealed off from the worker
+    puzzle_t2 ='#######\n#@ $ #.#\n#######'
+    wh = Warehouse()
+    wh.extract_locations(puzzle_t2.split(sep='\n'))
+    answer = solve_sokoban_macro(wh, bidirectional=True)
+    expected_answer = 'Impossible'
+    fcn = test_solve_sokoban_macro_bidirectional
+    print('<<  First test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+    # second test
+    puzzle_t1 ='#######\n#@ $ .#\n#######'
+    wh = Warehouse()
+    wh.extract_locations(puzzle_t1.split(sep='\n'))
+    answer = solve_sokoban_macro(wh, bidirectional=True)
+    expected_answer = [((1, 3), 'Right'), ((1, 4), 'Right')]
+    print('<<  Second test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_solution_cache():
+    puzzle_t1 ='#######\n#@ $ .#\n#######'
+    wh = Warehouse()
+    wh.extract_locations(puzzle_t1.split(sep='\n'))
+    with tempfile.TemporaryDirectory() as directory:
+        cache = SolutionCache(directory)
+        first = solve_sokoban_macro(wh, cache=cache)
+        # the second call is answered from the file written by the first
+        second = solve_sokoban_macro(wh, cache=cache)
+        answer = (first, second, cache.hits, cache.misses)
+    expected_answer = ([((1, 3), 'Right'), ((1, 4), 'Right')], [((1, 3), 'Right'), ((1, 4), 'Right')], 1, 1)
+    fcn = test_solution_cache
+    print('<<  Testing {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_solve_sokoban_elem_push_level():
+    # the worker walks around the box before pushing it
+    puzzle_t1 ='######\n#.$  #\n# @  #\n######'
+    wh = Warehouse()
+    wh.extract_locations(puzzle_t1.split(sep='\n'))
+    answer = solve_sokoban_elem(wh, push_level=True)
+    expected_answer = ['Right', 'Up', 'Left']
+    fcn = test_solve_sokoban_elem_push_level
+    print('<<  First test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+    # second test, replay the stitched solution: legal, and no box left off target
+    wh = Warehouse()
+    wh.load_warehouse("./warehouses/warehouse_0001.txt")
+    result = check_action_seq(wh, solve_sokoban_elem(wh, push_level=True))
+    answer = (result != 'Failure', '$' in result)
+    expected_answer = (True, False)
+    print('<<  Second test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_solve_sokoban_anytime():
+    wh = Warehouse()
+    wh.load_warehouse("./warehouses/warehouse_0001.txt")
+    # with no budget the anytime search ends on an optimal solution
+    actions = solve_sokoban_elem(wh, anytime=True)
+    answer = (is_solution(wh, actions), len(actions))
+    expected_answer = (True, len(solve_sokoban_elem(wh)))
+    fcn = test_solve_sokoban_anytime
+    print('<<  First test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+    # second test, a budget too small for any solution
+    try:
+        answer = solve_sokoban_macro(wh, anytime=True, node_limit=1)
+    except BudgetExhausted:
+        answer = 'BudgetExhausted'
+    expected_answer = 'BudgetExhausted'
+    print('<<  Second test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_idastar_search():
+    puzzle_t1 ='#######\n#@ $. #\n#######'
+    wh = Warehouse()
+    wh.extract_locations(puzzle_t1.split(sep='\n'))
+    solution = idastar_search(SokobanPuzzle(wh, history_check=False))
+    answer = solution.solution()
+    expected_answer = ['Right', 'Right']
+    fcn = test_idastar_search
+    print('<<  First test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+    # second test, an optimal solution as long as the breadth-first one
+    wh = Warehouse()
+    wh.load_warehouse("./warehouses/warehouse_0001.txt")
+    actions = idastar_search(SokobanPuzzle(wh, history_check=False)).solution()
+    answer = (is_solution(wh, actions), len(actions))
+    expected_answer = (True, len(breadth_first_graph_search(SokobanPuzzle(wh)).solution()))
+    print('<<  Second test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_solve_sokoban_macro_tunnels():
+    # the box goes through the one-cell tunnel of column 4 in one search step
+    puzzle_t1 ='#########\n#   #   #\n#@$    .#\n#   #   #\n#########'
+    wh = Warehouse()
+    wh.extract_locations(puzzle_t1.split(sep='\n'))
+    solver = SokobanPuzzle(wh, macro=True, tunnel_macros=True)
+    answer = astar_graph_search(solver).solution()
+    expected_answer = [((2, 2), 'Right'), ((2, 3), 'Right', 2), ((2, 5), 'Right'), ((2, 6), 'Right')]
+    fcn = test_solve_sokoban_macro_tunnels
+    print('<<  First test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+    # second test, the solution lists every push and replays
+    actions = solve_sokoban_macro(wh, tunnels=True)
+    answer = (actions, is_solution(wh, actions, macro=True))
+    expected_answer = ([((2, 2), 'Right'), ((2, 3), 'Right'), ((2, 4), 'Right'), ((2, 5), 'Right'), ((2, 6), 'Right')],
+                       True)
+    print('<<  Second test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+
+def test_solve_sokoban_bitboard():
+    puzzle_t1 ='#######\n#@ $. #\n#######'
+    wh = Warehouse()
+    wh.extract_locations(puzzle_t1.split(sep='\n'))
+    answer = solve_sokoban_elem(wh, engine='bitboard')
+    expected_answer = ['Right', 'Right']
+    fcn = test_solve_sokoban_bitboard
+    print('<<  First test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+    # second test
+    puzzle_t2 ='#######\n#@ $ .#\n#######'
+    wh = Warehouse()
+    wh.extract_locations(puzzle_t2.split(sep='\n'))
+    answer = solve_sokoban_macro(wh, engine='bitboard')
+    expected_answer = [((1, 3), 'Right'), ((1, 4), 'Right')]
+    print('<<  Second test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
+    # third test, the same optimal solution length as the tuple engine
+    wh = Warehouse()
+    wh.load_warehouse("./warehouses/warehouse_0001.txt")
+    actions = solve_sokoban_elem(wh, engine='bitboard')
+    answer = (is_solution(wh, actions), len(actions))
+    expected_answer = (True, len(solve_sokoban_elem(wh)))
+    print('<<  Third test of {} >>'.format(fcn.__name__))
+    if answer==expected_answer:
+        print(fcn.__name__, ' passed!  :-)\n')
+    else:
+        print(fcn.__name__, ' failed!  :-(\n')
+        print('Expected ');print(expected_answer)
+        print('But, received ');print(answer)
@@ -0,0 +1,131 @@
+'''
+Disk-backed explored set for searches that do not fit in RAM.
+
+A DiskBackedSet keeps the most recently added states in memory (the hot
+tier). Once the hot tier holds more than hot_capacity states, its oldest
+half is packed into fixed-size records and spilled to an open-addressing
+hash table in a memory-mapped temporary file on local disk (the cold tier).
+Lookups check the hot tier first and then probe the file.
+
+Pass one to best_first_graph_search / graph_search as 'explored', e.g.
+
+    explored = DiskBackedSet(puzzle.pack_state, puzzle.packed_size, hot_capacity=10 ** 6)
+    search.astar_graph_search(puzzle, explored=explored)
+'''
+import itertools
+import mmap
+import tempfile
+
+
+class DiskBackedSet:
+    '''
+    A set of states with an in-memory hot tier and a memory-mapped cold tier.
+    pack: function state -> bytes of exactly record_size bytes, two states
+          are the same if and only if their packed records are equal
+    hot_capacity: the number of states kept in memory
+    directory: where the temporary file is created (default: the system temp dir)
+    Each slot of the file is one flag byte (0 empty, 1 used) followed by a
+    record. The table doubles when it gets half full.
+    '''
+
+    def __init__(self, pack, record_size, hot_capacity=1000000, directory=None, initial_slots=1 << 16):
+        self.pack = pack
+        self.record_size = record_size
+        self.slot_size = record_size + 1
+        self.hot_capacity = hot_capacity
+        self.directory = directory
+        self.initial_slots = initial_slots
+        self.hot = {}  # insertion ordered, used as an ordered set
+        self.cold_count = 0
+        self.slots = 0
+        self.file = None
+        self.map = None
+
+    def add(self, state):
+        self.hot[state] = None
+        if len(self.hot) > self.hot_capacity:
+            self.spill(len(self.hot) // 2)
+
+    def __contains__(self, state):
+        if state in self.hot:
+            return True
+        if self.cold_count == 0:
+            return False
+        return self._find(self.pack(state))[0]
+
+    def __len__(self):
+        return len(self.hot) + self.cold_count
+
+    def spill(self, count):
+        '''
+        move the count oldest states of the hot tier to the file
+        '''
+        if self.map is None:
+            self._open(self.initial_slots)
+        for state in list(itertools.islice(self.hot, count)):
+            self._insert(self.pack(state))
+            del self.hot[state]
+
+    def close(self):
+        '''
+        release the memory map and delete the temporary file
+        '''
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+            self.map = self.file = None
+
+    def stats(self):
+        return {
+            'hot': len(self.hot),
+            'cold': self.cold_count,
+            'slots': self.slots,
+            'file_bytes': self.slots * self.slot_size,
+        }
+
+    def _open(self, slots):
+        self.file = tempfile.TemporaryFile(dir=self.directory)
+        self.file.truncate(slots * self.slot_size)
+        self.map = mmap.mmap(self.file.fileno(), slots * self.slot_size)
+        self.slots = slots
+
+    def _find(self, record):
+        '''
+        return (found, offset) where offset is the slot holding record,
+        or the empty slot where its linear probe ends
+        '''
+        slot_size, table = self.slot_size, self.map
+        slot = hash(record) % self.slots
+        while True:
+            offset = slot * slot_size
+            if table[offset] == 0:
+                return False, offset
+            if table[offset + 1:offset + slot_size] == record:
+                return True, offset
+            slot = (slot + 1) % self.slots
+
+    def _insert(self, record):
+        if 2 * (self.cold_count + 1) > self.slots:
+            self._grow()
+        found, offset = self._find(record)
+        if not found:
+            self._write(offset, record)
+            self.cold_count += 1
+
+    def _write(self, offset, record):
+        self.map[offset] = 1
+        self.map[offset + 1:offset + self.slot_size] = record
+
+    def _grow(self):
+        '''
+        double the table and rehash the records into a new file
+        '''
+        old_map, old_file, old_slots = self.map, self.file, self.slots
+        self._open(2 * old_slots)
+        slot_size = self.slot_size
+        for offset in range(0, old_slots * slot_size, slot_size):
+            if old_map[offset]:
+                record = old_map[offset + 1:offset + slot_size]
+                self._write(self._find(record)[1], record)
+        old_map.close()
+        old_file.close()
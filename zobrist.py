@@ -0,0 +1,83 @@
+'''
+Zobrist hashing of Sokoban states.
+
+Every cell gets one random 64-bit key for "a box is here" and one for
+"the worker is here". The hash of a state is the XOR of the keys of its
+worker cell and of all its box cells, so after a move or a push it is
+updated with two to four XORs instead of hashing the whole boxes tuple.
+
+SokobanPuzzle uses ZobristState for the tuple engine, see
+SokobanPuzzle(warehouse, zobrist=True).
+'''
+import random
+
+
+class ZobristState:
+    '''
+    A (worker, boxes) state with a cached Zobrist hash.
+    It unpacks and indexes like the (worker, boxes) tuple it replaces, so
+    `worker, boxes = state` and `state[1]` keep working.
+    Equality compares the hashes first and then the worker and the boxes,
+    so two different states with colliding hashes are never confused.
+    '''
+    __slots__ = ('worker', 'boxes', 'key')
+
+    def __init__(self, worker, boxes, key):
+        self.worker = worker
+        self.boxes = boxes
+        self.key = key
+
+    def __iter__(self):
+        return iter((self.worker, self.boxes))
+
+    def __getitem__(self, index):
+        return (self.worker, self.boxes)[index]
+
+    def __len__(self):
+        return 2
+
+    def __hash__(self):
+        return self.key
+
+    def __eq__(self, other):
+        if not isinstance(other, ZobristState):
+            return NotImplemented
+        return self.key == other.key and self.worker == other.worker and self.boxes == other.boxes
+
+    def __repr__(self):
+        return f'ZobristState({self.worker!r}, {self.boxes!r})'
+
+
+class ZobristTable:
+    '''
+    The random keys of a warehouse.
+    The generator is seeded, so the hashes are the same in every process.
+    '''
+
+    def __init__(self, cells, seed=680):
+        rng = random.Random(seed)
+        self.worker_keys = {}
+        self.box_keys = {}
+        for cell in sorted(cells):
+            self.worker_keys[cell] = rng.getrandbits(64)
+            self.box_keys[cell] = rng.getrandbits(64)
+
+    def state(self, worker, boxes):
+        '''
+        build a ZobristState, hashing all the boxes
+        '''
+        key = self.worker_keys[worker]
+        for box in boxes:
+            key ^= self.box_keys[box]
+        return ZobristState(worker, boxes, key)
+
+    def moved(self, state, worker, boxes, box=None, new_box=None):
+        '''
+        build the ZobristState reached from state, where the worker is now on
+        'worker' and, if a box was pushed, the box on 'box' is now on 'new_box'.
+        boxes is the new boxes tuple, the hash is updated incrementally.
+        '''
+        key = state.key ^ self.worker_keys[state.worker] ^ self.worker_keys[worker]
+        if box is not None:
+            key ^= self.box_keys[box] ^ self.box_keys[new_box]
+        return ZobristState(worker, boxes, key)